@@ -0,0 +1,124 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient, models
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+INGEST_DENSE_WORKERS = int(os.getenv("INGEST_DENSE_WORKERS", "2"))    # batch ที่ยิง Ollama พร้อมกันได้
+INGEST_SPARSE_WORKERS = int(os.getenv("INGEST_SPARSE_WORKERS", "2"))  # worker ของ BM25
+
+
+@dataclass
+class IngestStats:
+    chunks: int
+    batches: int
+    seconds: float
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+
+def build_points(batch: List[Document], ids: List[str], dense_vectors, sparse_vectors) -> List[models.PointStruct]:
+    """payload รูปแบบเดียวกับ QdrantVectorStore (page_content + metadata)"""
+    return [
+        models.PointStruct(
+            id=point_id,
+            vector={
+                "dense": dense,
+                "sparse": models.SparseVector(indices=sparse.indices, values=sparse.values),
+            },
+            payload={"page_content": doc.page_content, "metadata": doc.metadata},
+        )
+        for doc, point_id, dense, sparse in zip(batch, ids, dense_vectors, sparse_vectors)
+    ]
+
+
+def upsert_batch(client: QdrantClient, collection_name: str, points: List[models.PointStruct]) -> List[models.PointStruct]:
+    client.upsert(collection_name=collection_name, points=points, wait=True)
+    return points
+
+
+def embed_and_upsert(
+    client: QdrantClient,
+    collection_name: str,
+    documents: List[Document],
+    ids: List[str],
+    dense_embeddings,
+    sparse_embeddings,
+    batch_size: int = INGEST_BATCH_SIZE,
+    dense_workers: int = INGEST_DENSE_WORKERS,
+    sparse_workers: int = INGEST_SPARSE_WORKERS,
+    progress: Optional[Callable[..., None]] = None,
+) -> IngestStats:
+    """
+    embed แล้ว upsert เป็น batch แบบ pipeline
+    - dense (Ollama) ยิงพร้อมกันไม่เกิน dense_workers batch, sparse (BM25) ทำใน pool ของตัวเองไปพร้อมกัน
+    - upsert ทีละ batch ใน thread แยก → batch ถัดไป embed ระหว่างที่ batch ก่อนหน้ากำลังอัปโหลด
+    - batch ที่ embed ค้างรอไม่เกิน 2 เท่าของ dense_workers (คุมหน่วยความจำ)
+    - progress(chunks_embedded=..., chunks_upserted=...) หลังแต่ละ batch (ถ้า progress โยน exception
+      เช่นถูกยกเลิก batch ที่ยังไม่เริ่มจะถูกยกเลิกด้วย)
+    """
+    started = time.perf_counter()
+    batches = [
+        (documents[start:start + batch_size], ids[start:start + batch_size])
+        for start in range(0, len(documents), batch_size)
+    ]
+    window = max(dense_workers * 2, 1)
+
+    with ThreadPoolExecutor(max_workers=dense_workers, thread_name_prefix="ingest-dense") as dense_pool, \
+            ThreadPoolExecutor(max_workers=sparse_workers, thread_name_prefix="ingest-sparse") as sparse_pool, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-upsert") as upsert_pool:
+        pending: deque = deque()
+        upload: Optional[Future] = None
+        embedded = upserted = 0
+
+        def wait_upload():
+            nonlocal upserted
+            if upload is not None:
+                upserted += len(upload.result())  # ส่ง error ของ batch ก่อนหน้าออกมา และคงลำดับการเขียน
+                if progress:
+                    progress(chunks_upserted=upserted)
+
+        def flush_oldest():
+            nonlocal upload, embedded
+            batch, batch_ids, dense_future, sparse_future = pending.popleft()
+            points = build_points(batch, batch_ids, dense_future.result(), sparse_future.result())
+            embedded += len(points)
+            if progress:
+                progress(chunks_embedded=embedded)
+            wait_upload()
+            upload = upsert_pool.submit(upsert_batch, client, collection_name, points)
+
+        try:
+            for batch, batch_ids in batches:
+                texts = [doc.page_content for doc in batch]
+                pending.append((
+                    batch,
+                    batch_ids,
+                    dense_pool.submit(dense_embeddings.embed_documents, texts),
+                    sparse_pool.submit(sparse_embeddings.embed_documents, texts),
+                ))
+                if len(pending) >= window:
+                    flush_oldest()
+
+            while pending:
+                flush_oldest()
+            wait_upload()
+        except BaseException:
+            for _, _, dense_future, sparse_future in pending:
+                dense_future.cancel()
+                sparse_future.cancel()
+            raise
+
+    stats = IngestStats(chunks=len(documents), batches=len(batches), seconds=time.perf_counter() - started)
+    print(
+        f"⚡ embed + upsert {stats.chunks} chunks ใน {stats.batches} batch "
+        f"{stats.seconds:.1f}s ({stats.chunks_per_second:.1f} chunks/s)"
+    )
+    return stats
@@ -1,94 +1,477 @@
+import hashlib
 import os
-from langchain_ollama import OllamaEmbeddings
-from langchain_qdrant import FastEmbedSparse, QdrantVectorStore, RetrievalMode
-from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+import uuid
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import Distance, VectorParams, SparseVectorParams
 from app.documents.file_markdown import read_markdown_file, clean_markdown_and_thai_digits_all
+from app.managers.db_manager import db_manager
+from app.managers.document_store import ParentRecord
+from app.chunks.embedding_pipeline import embed_and_upsert
+from app.chunks.markdown_sections import iter_markdown_sections
 
 from langchain_core.documents import Document
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "http://qdrant:6333")
+DEFAULT_STORAGE_PROFILE = os.getenv("QDRANT_STORAGE_PROFILE", "ram-float")
+DENSE_SIZE = 1024  # bge-m3
+KEEP_COLLECTION_VERSIONS = int(os.getenv("KEEP_COLLECTION_VERSIONS", "2"))  # version ที่เก็บไว้ rollback (รวมตัวที่ใช้อยู่)
+VERSION_SEPARATOR = "__v"  # thai_law_hybrid → thai_law_hybrid__v42
 
-def split_and_index_with_tracking(documents: list[Document], size: int, overlap: int):
+# รูปแบบการจัดเก็บ collection เลือกได้ตอน ingest
+# - ram-float      : float32 ทั้งหมดใน RAM (แบบเดิม)
+# - int8-scalar    : vector ต้นฉบับบนดิสก์ + scalar int8 ใน RAM (ลด RAM ~4 เท่า)
+# - binary+rescore : vector ต้นฉบับบนดิสก์ + binary ใน RAM (ลด RAM ~32 เท่า) ต้อง rescore ตอนค้น
+# - on-disk        : vector, HNSW, payload และ sparse index อยู่บนดิสก์ทั้งหมด
+STORAGE_PROFILES = {
+    "ram-float": {
+        "dense_on_disk": False,
+        "sparse_on_disk": False,
+        "on_disk_payload": False,
+        "quantization": None,
+        "hnsw": None,
+    },
+    "int8-scalar": {
+        "dense_on_disk": True,
+        "sparse_on_disk": False,
+        "on_disk_payload": False,
+        "quantization": models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        ),
+        "hnsw": None,
+    },
+    "binary+rescore": {
+        "dense_on_disk": True,
+        "sparse_on_disk": False,
+        "on_disk_payload": False,
+        "quantization": models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True)),
+        "hnsw": None,
+    },
+    "on-disk": {
+        "dense_on_disk": True,
+        "sparse_on_disk": True,
+        "on_disk_payload": True,
+        "quantization": None,
+        "hnsw": models.HnswConfigDiff(on_disk=True),
+    },
+}
+
+HEADERS_TO_SPLIT_ON = {
+    "law": [("#", "title"), ("##", "chapter"), ("###", "section"), ("####", "article")],
+    # unknown
+    "unknown": [
+        ("#", "document"),      # เช่น "สิทธิประโยชน์"
+        ("##", "category"),     # เช่น "สวัสดิการ"
+        ("###", "item"),        # เช่น "เงินเดือน"
+        ("####", "detail")      # บางเอกสารอาจมี เช่น เงื่อนไขเฉพาะ
+    ],
+}
+
+# payload index ที่ต้องมีเสมอ (ใช้ใน filter ตอนดึง chunk ของ parent)
+PAYLOAD_INDEXES = {
+    "metadata.parent_id": models.PayloadSchemaType.KEYWORD,
+    "metadata.chunk_id": models.PayloadSchemaType.INTEGER,
+    "metadata.source": models.PayloadSchemaType.KEYWORD,  # ใช้ลบ/เทียบ chunk ของเอกสารเดิมตอน ingest ซ้ำ
+}
+
+def headers_for(doc_type: str) -> list[tuple[str, str]]:
+    return HEADERS_TO_SPLIT_ON.get(doc_type, HEADERS_TO_SPLIT_ON["unknown"])
+
+def payload_indexes_for(doc_type: str) -> dict:
+    """payload index ของ parent_id/chunk_id + field หัวข้อของประเภทเอกสาร (keyword)"""
+    indexes = dict(PAYLOAD_INDEXES)
+    for _, field in headers_for(doc_type):
+        indexes[f"metadata.{field}"] = models.PayloadSchemaType.KEYWORD
+    return indexes
+
+def create_payload_indexes(client: QdrantClient, collection_name: str, doc_type: str = "unknown"):
+    """สร้าง payload index (เรียกซ้ำได้ field ที่มี index อยู่แล้วจะถูกข้าม)"""
+    existing = client.get_collection(collection_name).payload_schema or {}
+    created = []
+    for field_name, schema in payload_indexes_for(doc_type).items():
+        if field_name in existing:
+            continue
+        client.create_payload_index(collection_name, field_name=field_name, field_schema=schema, wait=True)
+        created.append(field_name)
+
+    print(f"🗂️ payload index '{collection_name}': สร้าง {len(created)} ({', '.join(created) or '-'}), มีอยู่แล้ว {len(existing)}")
+    return created
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def parent_key(metadata: dict, headers: list[tuple[str, str]]) -> str:
+    """path ของหัวข้อ เช่น "พ.ร.บ. ... / หมวด 1 / มาตรา 5" ใช้ระบุ section โดยไม่ขึ้นกับลำดับในไฟล์"""
+    return " / ".join(metadata[field] for _, field in headers if metadata.get(field))
+
+def assign_parent_ids(documents: list[Document], source: str, headers: list[tuple[str, str]]) -> list[str]:
+    """
+    parent_id แบบคงที่จาก (source, path ของหัวข้อ, ลำดับที่ซ้ำ)
+    section ที่ไม่ได้แก้จะได้ id เดิมแม้มีการแทรก/ลบ section อื่นในไฟล์
+    """
+    seen: dict[str, int] = {}
+    parent_ids = []
+    for doc in documents:
+        key = parent_key(doc.metadata, headers)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        digest = hashlib.sha1(f"{source}|{key}#{occurrence}".encode("utf-8")).hexdigest()[:16]
+        parent_ids.append(f"{source}-{digest}")
+    return parent_ids
+
+def chunk_point_id(parent_id: str, chunk_id: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{parent_id}/{chunk_id}"))
+
+def split_and_index_with_tracking(documents: list[Document], size: int, overlap: int, parent_ids: list[str] | None = None):
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
     all_chunks = []
 
     for i, doc in enumerate(documents):
         splits = text_splitter.split_text(doc.page_content)
+        parent_id = parent_ids[i] if parent_ids else f"doc-{i}"
 
         for j, chunk in enumerate(splits):
             all_chunks.append(Document(
                 page_content=chunk,
                 metadata={
                     **doc.metadata,
-                    "parent_id": f"doc-{i}",
+                    "parent_id": parent_id,
                     "chunk_id": j,
-                    "chunk_total": len(splits)
+                    "chunk_total": len(splits),
+                    "content_hash": content_hash(chunk),
                 }
             ))
 
     return all_chunks
 
-def add_to_vector_db(md_path: str, collection_name: str = "default", doc_type: str = "unknown"):
+def parent_records(documents: list[Document], chunks: list[Document], parent_ids: list[str]) -> list[ParentRecord]:
+    """parent ต่อ section (documents[i] ↔ parent_ids[i]) พร้อม chunk ของมันตามลำดับ chunk_id"""
+    grouped: dict[str, list[str]] = {}
+    for chunk in chunks:
+        grouped.setdefault(chunk.metadata["parent_id"], []).append(chunk.page_content)
 
-    # ✅ 1. Markdown Split ตามหัวข้อ
-    if (doc_type == "law"):
-        headers_to_split_on = [("#", "title"), ("##", "chapter"), ("###", "section"), ("####", "article")]
-    # unknown
-    else :
-        headers_to_split_on = [
-            ("#", "document"),      # เช่น "สิทธิประโยชน์"
-            ("##", "category"),     # เช่น "สวัสดิการ"
-            ("###", "item"),        # เช่น "เงินเดือน"
-            ("####", "detail")      # บางเอกสารอาจมี เช่น เงื่อนไขเฉพาะ
+    return [
+        ParentRecord(
+            parent_id=parent_id,
+            content=doc.page_content,
+            chunks=tuple(grouped.get(parent_id, ())),
+            metadata=dict(doc.metadata),
+        )
+        for parent_id, doc in zip(parent_ids, documents)
+    ]
+
+def existing_chunk_hashes(client: QdrantClient, collection_name: str, source: str) -> dict[str, str]:
+    """{point id: content_hash} ของ chunk ที่ index ไว้แล้วของเอกสารนี้"""
+    hashes = {}
+    offset = None
+    while True:
+        batch, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=models.Filter(
+                must=[models.FieldCondition(key="metadata.source", match=models.MatchValue(value=source))]
+            ),
+            limit=256,
+            offset=offset,
+            with_payload=models.PayloadSelectorInclude(include=["metadata.content_hash"]),
+            with_vectors=False,
+        )
+        for point in batch:
+            hashes[str(point.id)] = (point.payload or {}).get("metadata", {}).get("content_hash")
+        if offset is None:
+            break
+    return hashes
+
+def delete_legacy_chunks(client: QdrantClient, collection_name: str) -> int:
+    """ลบ chunk ที่ index ด้วยวิธีเดิม (ลบแล้วสร้าง collection ใหม่ ไม่มี metadata.source)"""
+    legacy = models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="metadata.source"))])
+    count = client.count(collection_name, count_filter=legacy, exact=True).count
+    if count:
+        print(f"⚠️ ลบ chunk แบบเดิมที่ไม่มี source: {count} รายการ")
+        client.delete(collection_name, points_selector=models.FilterSelector(filter=legacy), wait=True)
+        db_manager.parent_store.delete_source(collection_name, "")
+    return count
+
+def copy_other_sources(client: QdrantClient, collection_name: str, target: str, source: str) -> int:
+    """
+    คัดลอก point ของเอกสารอื่นทั้งหมด (ยกเว้น source นี้และ chunk แบบเดิมที่ไม่มี source) พร้อม vector
+    จาก collection ที่ใช้อยู่ไป version ใหม่ → สร้าง version ใหม่ได้โดยไม่ต้อง embed เอกสารอื่นซ้ำ และไม่มีเอกสารหายจาก alias
+    """
+    copied = 0
+    offset = None
+    others = models.Filter(
+        must_not=[
+            models.FieldCondition(key="metadata.source", match=models.MatchValue(value=source)),
+            models.IsEmptyCondition(is_empty=models.PayloadField(key="metadata.source")),
         ]
+    )
+    while True:
+        batch, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=others,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if batch:
+            client.upsert(
+                collection_name=target,
+                points=[models.PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in batch],
+                wait=True,
+            )
+            copied += len(batch)
+        if offset is None:
+            break
+    if copied:
+        print(f"📦 คัดลอก chunk ของเอกสารอื่น {copied} รายการ '{collection_name}' → '{target}'")
+    return copied
 
-    markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on, strip_headers=False)
-    markdown_read = read_markdown_file(md_path)
-    md_split_text = markdown_splitter.split_text(markdown_read)
-    md_documents = clean_markdown_and_thai_digits_all(md_split_text)
+def collection_versions(client: QdrantClient, collection_name: str) -> list[int]:
+    """version ของ collection จริงทั้งหมดของชื่อนี้ เรียงจากเก่าไปใหม่"""
+    prefix = f"{collection_name}{VERSION_SEPARATOR}"
+    return sorted(
+        int(c.name[len(prefix):])
+        for c in client.get_collections().collections
+        if c.name.startswith(prefix) and c.name[len(prefix):].isdigit()
+    )
 
-    # ✅ 2. Split ย่อยตามขนาด
-    docs = split_and_index_with_tracking(md_documents, 512, 10)
+def versioned_name(collection_name: str, version: int) -> str:
+    return f"{collection_name}{VERSION_SEPARATOR}{version}"
 
-    # ✅ 3. Embedding (ใช้ Ollama)
-    embeddings = OllamaEmbeddings(model="bge-m3:latest")
-    sparse_embeddings = FastEmbedSparse(model_name="Qdrant/bm25")
+def alias_target(client: QdrantClient, collection_name: str) -> str | None:
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == collection_name:
+            return alias.collection_name
+    return None
 
-    # ✅ 4. เตรียม Qdrant Hybrid DB
-    client = QdrantClient(url=QDRANT_HOST)
-    # collection_name = "thai_law_hybrid"
+def collection_exists(client: QdrantClient, collection_name: str) -> bool:
+    """มี alias หรือ collection จริงชื่อนี้อยู่"""
+    return alias_target(client, collection_name) is not None or client.collection_exists(collection_name)
+
+def switch_alias(client: QdrantClient, collection_name: str, physical_name: str):
+    """ชี้ alias ไปที่ collection จริงตัวใหม่ (ลบ + สร้าง alias ในคำขอเดียว = atomic)"""
+    operations = []
+    if alias_target(client, collection_name) is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=collection_name)))
+    elif client.collection_exists(collection_name):
+        # collection แบบเดิมที่ไม่ได้ใช้ alias: ต้องลบก่อนจึงสร้าง alias ชื่อเดียวกันได้ (ครั้งเดียวตอนย้ายระบบ)
+        print(f"⚠️ ลบ collection เดิมที่ไม่มี version: '{collection_name}'")
+        client.delete_collection(collection_name)
+
+    operations.append(models.CreateAliasOperation(create_alias=models.CreateAlias(
+        collection_name=physical_name, alias_name=collection_name
+    )))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"🔀 alias '{collection_name}' → '{physical_name}'")
+
+def prune_collection_versions(client: QdrantClient, collection_name: str, keep: int = KEEP_COLLECTION_VERSIONS):
+    """ลบ version เก่าให้เหลือ keep ตัวล่าสุด (ไม่ลบตัวที่ alias ชี้อยู่)"""
+    current = alias_target(client, collection_name)
+    for version in collection_versions(client, collection_name)[:-keep or None]:
+        physical_name = versioned_name(collection_name, version)
+        if physical_name != current:
+            client.delete_collection(physical_name)
+            print(f"🗑️ ลบ version เก่า: '{physical_name}'")
 
-    # 🔄 ลบ collection เดิม (ถ้ามี)
-    existing_collections = [c.name for c in client.get_collections().collections]
-    if collection_name in existing_collections:
-        print(f"⚠️ ลบ collection เดิม: '{collection_name}'...")
-        client.delete_collection(collection_name=collection_name)
+def rollback_collection(collection_name: str) -> str:
+    """ชี้ alias กลับไป version ก่อนหน้าที่ยังเก็บไว้"""
+    client = db_manager.client
+    current = alias_target(client, collection_name)
+    versions = [versioned_name(collection_name, v) for v in collection_versions(client, collection_name)]
+    if current not in versions or versions.index(current) == 0:
+        raise ValueError(f"ไม่มี version ก่อนหน้าของ '{collection_name}' ให้ rollback")
+
+    previous = versions[versions.index(current) - 1]
+    switch_alias(client, collection_name, previous)
+    # parent store ไม่ได้แยกตาม version → ล้างของ collection นี้ ให้ดึงจาก Qdrant (version ที่ rollback) แทน
+    db_manager.parent_store.delete_collection(collection_name)
+    db_manager.file_registry.delete_collection(collection_name)
+    db_manager.invalidate_collection(collection_name)
+    return previous
+
+def create_collection_with_profile(client: QdrantClient, collection_name: str, storage_profile: str = DEFAULT_STORAGE_PROFILE):
+    if storage_profile not in STORAGE_PROFILES:
+        raise ValueError(f"ไม่รู้จัก storage profile: {storage_profile} (มี {', '.join(STORAGE_PROFILES)})")
+    profile = STORAGE_PROFILES[storage_profile]
 
-    # ✅ สร้าง collection ใหม่
     client.create_collection(
         collection_name=collection_name,
-        vectors_config={"dense": VectorParams(size=1024, distance=Distance.COSINE)},
+        vectors_config={
+            "dense": VectorParams(size=DENSE_SIZE, distance=Distance.COSINE, on_disk=profile["dense_on_disk"])
+        },
         sparse_vectors_config={
-            "sparse": SparseVectorParams(index=models.SparseIndexParams(on_disk=False))
+            "sparse": SparseVectorParams(index=models.SparseIndexParams(on_disk=profile["sparse_on_disk"]))
         },
+        quantization_config=profile["quantization"],
+        hnsw_config=profile["hnsw"],
+        on_disk_payload=profile["on_disk_payload"],
     )
 
-    print(f"✅ สร้าง collection ใหม่: '{collection_name}'")
+    print(f"✅ สร้าง collection ใหม่: '{collection_name}' (profile: {storage_profile})")
 
-    # ✅ 5. ส่งเข้าฐาน Hybrid Vector Search
-    vectorstore = QdrantVectorStore(
-        client=client,
-        collection_name=collection_name,
-        embedding=embeddings,
-        sparse_embedding=sparse_embeddings,
-        retrieval_mode=RetrievalMode.HYBRID,
-        vector_name="dense",
-        sparse_vector_name="sparse",
-    )
+def add_to_vector_db(
+    md_path: str,
+    collection_name: str = "default",
+    doc_type: str = "unknown",
+    storage_profile: str = DEFAULT_STORAGE_PROFILE,
+    recreate: bool = False,
+    progress: Optional[Callable[..., None]] = None,
+) -> dict:
+    """index ไฟล์ markdown (source = ชื่อไฟล์) ดู index_markdown_lines"""
+    lines = read_markdown_file(md_path).split("\n")
+    return index_markdown_lines(lines, Path(md_path).stem, collection_name, doc_type, storage_profile, recreate, progress)
+
+def index_markdown_lines(
+    lines: Iterable[str],
+    source: str,
+    collection_name: str = "default",
+    doc_type: str = "unknown",
+    storage_profile: str = DEFAULT_STORAGE_PROFILE,
+    recreate: bool = False,
+    progress: Optional[Callable[..., None]] = None,
+) -> dict:
+    """
+    index เอกสารหนึ่งไฟล์แบบ incremental (chunk ที่ไม่เปลี่ยนไม่ต้อง embed ใหม่)
+    lines = markdown ทีละบรรทัด (เช่น generator จาก stream_law_markdown) แบ่ง section ไปพร้อมกับที่อ่าน
+    - point id คงที่จาก (source, path ของหัวข้อ, chunk_id), เทียบกับ content_hash ใน payload
+    - chunk ใหม่/แก้ไข → upsert, ไม่เปลี่ยน → ข้าม, section ที่หายไป → ลบด้วย filter
+    - storage_profile ใช้ตอนสร้าง collection ใหม่ (ครั้งแรก หรือ recreate=True)
+      ซึ่งจะสร้างเป็น "<ชื่อ>__v<n>" แล้วสลับ alias "<ชื่อ>" ไปหาเมื่อข้อมูลครบ
+      (chunk ของเอกสารอื่นใน collection เดิมถูกคัดลอกไปด้วย มีแค่ chunk แบบเดิมที่ไม่มี source ที่ถูกทิ้ง)
+    คืนจำนวน {"added", "updated", "skipped", "deleted"}
+    progress(stage=..., **counts) ถูกเรียกระหว่างทาง (ใช้รายงานความคืบหน้า/ยกเลิกงาน)
+    """
+    # ตรวจ profile ก่อนลบ collection เดิม
+    if storage_profile not in STORAGE_PROFILES:
+        raise ValueError(f"ไม่รู้จัก storage profile: {storage_profile} (มี {', '.join(STORAGE_PROFILES)})")
+
+    # ✅ 1. Markdown Split ตามหัวข้อ (ผลเดียวกับ MarkdownHeaderTextSplitter แต่ทีละบรรทัด)
+    headers_to_split_on = headers_for(doc_type)
+
+    md_documents = clean_markdown_and_thai_digits_all(iter_markdown_sections(lines, headers_to_split_on))
+    for doc in md_documents:
+        doc.metadata["source"] = source
+
+    if progress:
+        progress(stage="splitting")
+
+    # ✅ 2. Split ย่อยตามขนาด
+    parent_ids = assign_parent_ids(md_documents, source, headers_to_split_on)
+    docs = split_and_index_with_tracking(md_documents, 512, 10, parent_ids)
+
+    # ✅ 3. เตรียม Qdrant Hybrid DB
+    client = db_manager.client  # remote หรือ local ตาม VECTOR_BACKEND
+    # collection_name = "thai_law_hybrid"
+
+    # สร้างใหม่ทั้งหมด (ครั้งแรก หรือ recreate) → สร้างเป็น version ใหม่แล้วค่อยสลับ alias
+    # ระหว่างนั้นแชทยังค้น version เดิมได้ตามปกติ
+    existed = collection_exists(client, collection_name)
+    rebuild = recreate or not existed
+    target = collection_name
+    carried = 0
+    if rebuild:
+        target = versioned_name(collection_name, max(collection_versions(client, collection_name), default=0) + 1)
+        # ✅ สร้าง collection ใหม่ ตาม storage profile
+        create_collection_with_profile(client, target, storage_profile)
+        # สร้าง index ก่อนใส่ข้อมูล เพื่อให้ HNSW สร้าง link สำหรับ filter ไปพร้อมกัน
+        create_payload_indexes(client, target, doc_type)
+        deleted = 0
+    else:
+        deleted = delete_legacy_chunks(client, collection_name)
+
+    # ✅ 4. เทียบกับ chunk เดิมของเอกสารนี้
+    existing = {} if rebuild else existing_chunk_hashes(client, collection_name, source)
+    ids = [chunk_point_id(doc.metadata["parent_id"], doc.metadata["chunk_id"]) for doc in docs]
+
+    to_write, write_ids = [], []
+    added = updated = skipped = 0
+    for point_id, doc in zip(ids, docs):
+        old_hash = existing.get(point_id)
+        if old_hash == doc.metadata["content_hash"]:
+            skipped += 1
+            continue
+        if point_id in existing:
+            updated += 1
+        else:
+            added += 1
+        to_write.append(doc)
+        write_ids.append(point_id)
+
+    if progress:
+        progress(stage="embedding", chunks_total=len(to_write), chunks_embedded=0, chunks_upserted=0)
+
+    try:
+        # version ใหม่ต้องมีเอกสารอื่นของ collection ครบก่อนสลับ alias
+        if rebuild and existed:
+            carried = copy_other_sources(client, collection_name, target, source)
+
+        # ✅ 5. embed (Ollama + BM25 ใช้ instance เดียวกับตอนค้นหา) แล้ว upsert เฉพาะที่เปลี่ยน
+        stats = embed_and_upsert(
+            client,
+            target,
+            to_write,
+            write_ids,
+            db_manager.dense_embeddings,
+            db_manager.sparse_embeddings,
+            progress=progress,
+        )
+
+        # ✅ 6. ลบ chunk ของ section ที่หายไป/สั้นลง (อยู่ใน source นี้แต่ไม่อยู่ใน id ชุดใหม่)
+        stale = len(set(existing) - set(ids))
+        if stale:
+            client.delete(
+                collection_name,
+                points_selector=models.FilterSelector(filter=models.Filter(
+                    must=[models.FieldCondition(key="metadata.source", match=models.MatchValue(value=source))],
+                    must_not=[models.HasIdCondition(has_id=ids)],
+                )),
+                wait=True,
+            )
+        deleted += stale
+
+        # ✅ 7. ตรวจจำนวน point ของ version ใหม่ แล้วสลับ alias (version เดิมยังอยู่จนกว่าจะถูก prune)
+        if rebuild:
+            count = client.count(target, exact=True).count
+            if count != len(docs) + carried:
+                raise RuntimeError(
+                    f"จำนวน point ใน '{target}' ไม่ตรง ({count} != {len(docs)} + {carried}) ยกเลิกการสลับ alias"
+                )
+            switch_alias(client, collection_name, target)
+    except BaseException:
+        if rebuild:
+            # version ใหม่ที่สร้างไม่เสร็จ (ล้มเหลว/ถูกยกเลิก) ไม่เคยถูกใช้งาน → ลบทิ้ง
+            if client.collection_exists(target):
+                client.delete_collection(target)
+                print(f"🗑️ ลบ version ที่สร้างไม่เสร็จ: '{target}'")
+        else:
+            # upsert ไปแล้วบางส่วนใน collection ที่ใช้งานอยู่ → parent ใน store ไม่ตรงกับ chunk ใน Qdrant แล้ว
+            # ลบ parent ของ source นี้ให้ hydrate จาก Qdrant แทน และเลื่อน index version ให้ cache เดิมหมดอายุ
+            db_manager.parent_store.delete_source(collection_name, source)
+            db_manager.invalidate_collection(collection_name)
+        raise
+
+    if rebuild:
+        prune_collection_versions(client, collection_name)
+        # เอกสารอื่นถูกคัดลอกไปครบ → parent/ทะเบียนไฟล์ของมันยังใช้ได้ ลบเฉพาะของ chunk แบบเดิมที่ไม่ได้คัดลอก
+        db_manager.parent_store.delete_source(collection_name, "")
+
+    # ✅ 8. เก็บ parent เต็มไว้ในเครื่อง ให้ตอนค้นหาไม่ต้อง scroll chunk จาก Qdrant
+    db_manager.parent_store.replace_source(collection_name, source, parent_records(md_documents, docs, parent_ids))
 
-    vectorstore.add_documents(documents=docs)
+    # 🔄 index เปลี่ยน → ให้ cache ที่อ้างถึง index เดิมหมดอายุ
+    if added or updated or deleted or rebuild:
+        db_manager.invalidate_collection(collection_name)
 
-    print("✅ Done: Indexed into Qdrant!")
+    report = {
+        "added": added,
+        "updated": updated,
+        "skipped": skipped,
+        "deleted": deleted,
+        "embed_seconds": round(stats.seconds, 2),
+        "chunks_per_second": round(stats.chunks_per_second, 1),
+    }
+    print(f"✅ Done: Indexed '{source}' into '{collection_name}' {report}")
+    return report
@@ -0,0 +1,101 @@
+from typing import Iterable, Iterator, Optional
+
+from langchain_core.documents import Document
+
+
+def iter_markdown_sections(
+    lines: Iterable[str],
+    headers_to_split_on: list[tuple[str, str]],
+    strip_headers: bool = False,
+) -> Iterator[Document]:
+    """
+    MarkdownHeaderTextSplitter.split_text แบบ stream: รับ markdown ทีละบรรทัด คืน Document ทีละ section
+    ผลเหมือน split_text (return_each_line=False) ทุกอย่าง รวมถึงการรวมหัวข้อที่ไม่มีเนื้อหาเข้ากับหัวข้อย่อยถัดไป
+    แต่ถือไว้แค่ section ที่ยังต่อได้ ไม่ต้องมีข้อความทั้งไฟล์ใน memory
+    """
+    headers = sorted(headers_to_split_on, key=lambda split: len(split[0]), reverse=True)
+
+    current_content: list[str] = []
+    current_metadata: dict[str, str] = {}
+    header_stack: list[dict] = []
+    initial_metadata: dict[str, str] = {}
+    in_code_block = False
+    opening_fence = ""
+
+    # section ล่าสุดที่ยังอาจถูกต่อเนื้อหา (aggregate_lines_to_chunks) → ส่งออกเมื่อเริ่ม section ใหม่
+    pending: Optional[dict] = None
+
+    def aggregate(content: str, metadata: dict) -> Optional[Document]:
+        nonlocal pending
+        if pending is not None and pending["metadata"] == metadata:
+            pending["content"] += "  \n" + content
+        elif (
+            pending is not None
+            and len(pending["metadata"]) < len(metadata)
+            and pending["content"].rsplit("\n", 1)[-1][0] == "#"
+            and not strip_headers
+        ):
+            # section ก่อนหน้าเป็นหัวข้อระดับบนที่ยังไม่มีเนื้อหา → รวมกับหัวข้อย่อยนี้
+            pending["content"] += "  \n" + content
+            pending["metadata"] = metadata
+        else:
+            finished = pending
+            pending = {"content": content, "metadata": metadata}
+            if finished is not None:
+                return Document(page_content=finished["content"], metadata=finished["metadata"])
+        return None
+
+    for line in lines:
+        stripped_line = line.strip()
+        stripped_line = "".join(filter(str.isprintable, stripped_line))
+        if not in_code_block:
+            if stripped_line.startswith("```") and stripped_line.count("```") == 1:
+                in_code_block = True
+                opening_fence = "```"
+            elif stripped_line.startswith("~~~"):
+                in_code_block = True
+                opening_fence = "~~~"
+        elif stripped_line.startswith(opening_fence):
+            in_code_block = False
+            opening_fence = ""
+
+        if in_code_block:
+            current_content.append(stripped_line)
+            continue
+
+        finished = None
+        for sep, name in headers:
+            if stripped_line.startswith(sep) and (len(stripped_line) == len(sep) or stripped_line[len(sep)] == " "):
+                if name is not None:
+                    current_header_level = sep.count("#")
+                    while header_stack and header_stack[-1]["level"] >= current_header_level:
+                        popped_header = header_stack.pop()
+                        initial_metadata.pop(popped_header["name"], None)
+                    header = {"level": current_header_level, "name": name, "data": stripped_line[len(sep):].strip()}
+                    header_stack.append(header)
+                    initial_metadata[name] = header["data"]
+
+                if current_content:
+                    finished = aggregate("\n".join(current_content), current_metadata.copy())
+                    current_content.clear()
+
+                if not strip_headers:
+                    current_content.append(stripped_line)
+                break
+        else:
+            if stripped_line:
+                current_content.append(stripped_line)
+            elif current_content:
+                finished = aggregate("\n".join(current_content), current_metadata.copy())
+                current_content.clear()
+
+        current_metadata = initial_metadata.copy()
+        if finished is not None:
+            yield finished
+
+    if current_content:
+        finished = aggregate("\n".join(current_content), current_metadata)
+        if finished is not None:
+            yield finished
+    if pending is not None:
+        yield Document(page_content=pending["content"], metadata=pending["metadata"])
@@ -1,14 +1,23 @@
 import os
 import fitz  # PyMuPDF
+import multiprocessing
 import re
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional
 
 from langchain_core.documents import Document
 
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))         # process ที่ดึงข้อความ PDF (0/1 = serial)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))  # PDF สั้นกว่านี้ไม่คุ้มค่าเปิด process
+PDF_EXTRACT_VERIFY = os.getenv("PDF_EXTRACT_VERIFY", "0") == "1"         # เทียบผล parallel กับ serial ทุกไฟล์
+# ที่เขียนไฟล์ markdown ไว้ดูระหว่าง ingest แบบ stream ("" = ไม่เขียน ข้อมูลไม่ผ่านไฟล์อยู่แล้ว)
+MARKDOWN_ARTIFACT_DIR = os.getenv("MARKDOWN_ARTIFACT_DIR", "extracted_md")
+
 # รวม metadata
-def clean_markdown_and_thai_digits_all(documents: list[Document]) -> list[Document]:
+def clean_markdown_and_thai_digits_all(documents: Iterable[Document]) -> list[Document]:
     def thai_digit_to_arabic(text: str) -> str:
         return text.translate(str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789"))
 
@@ -64,59 +73,82 @@ def thai_digit_to_int(thai_num: str) -> int:
     digit_map = {'๐': '0','๑': '1','๒': '2','๓': '3','๔': '4','๕': '5','๖': '6','๗': '7','๘': '8','๙': '9'}
     return int(''.join(digit_map.get(ch, ch) for ch in thai_num))
 
+THAI_DIGIT_CLASS = r"[๐๑๒๓๔๕๖๗๘๙\d]"
+MATRA_PATTERN = rf"มาตรา\s+(?P<number>{THAI_DIGIT_CLASS}+)(?:/{THAI_DIGIT_CLASS}+)?(?: ทวิ| ตรี| จัตวา)?"
+
+MATRA_NUMBER_RE = re.compile(rf"^มาตรา\s+({THAI_DIGIT_CLASS}+)")
+MATRA_NUMBER_ONLY_RE = re.compile(rf"{THAI_DIGIT_CLASS}{{1,4}}")
+STANDALONE_MATRA_RE = re.compile(rf"({MATRA_PATTERN})")
+MATRA_AT_LINE_START_RE = re.compile(rf"^({MATRA_PATTERN})\b")
+
+# จำแนกบรรทัด (ที่ clean แล้ว) ด้วย match ครั้งเดียว: ชื่อ group ที่ match = ชนิดของบรรทัด ไม่ match = เนื้อหา
+# - chapter: "หมวด ๑" ทั้งบรรทัด  - section: ขึ้นต้น "ส่วนที่"  - heading: บทเฉพาะกาล/บทนิยาม/บทกำหนดโทษ
+# - article: มาตราต้นบรรทัด ($ ก่อน → มาตราทั้งบรรทัดรวมคำต่อท้าย, ไม่งั้น \b → มาตราที่มีเนื้อหาตามหลัง)
+LINE_CLASSIFIER_RE = re.compile(
+    rf"(?P<chapter>หมวด\s+{THAI_DIGIT_CLASS}+$)"
+    r"|(?P<section>ส่วนที่)"
+    rf"|(?P<article>{MATRA_PATTERN})(?:$|\b)"
+    r"|(?P<heading>บทเฉพาะกาล|บทนิยาม|บทกำหนดโทษ)"
+)
+
+GAZETTE_PAGE_RE = re.compile(r"^หน้า\s+[๐-๙\d]+$")
+GAZETTE_HEADER_RE = re.compile(
+    r"""
+    ^เล่ม\s+[๐-๙\d]+\s+ตอนที่\s+[๐-๙\d]+(?:\s+[ก-ฮ])?\s+
+    ราชกิจจานุเบกษา\s+
+    [๐-๙\d]+\s+[ก-๙]+\s+[๐-๙\d]{4}$
+    """,
+    flags=re.VERBOSE,
+)
+
 def extract_matra_number(text: str) -> Optional[int]:
-    m = re.match(r"^มาตรา\s+([๐๑๒๓๔๕๖๗๘๙\d]+)", clean_line(text))
+    m = MATRA_NUMBER_RE.match(clean_line(text))
     return thai_digit_to_int(m.group(1)) if m else None
 
 def clean_line(text: str) -> str:
+    # NFKC แปลง NBSP/narrow NBSP เป็นช่องว่างอยู่แล้ว เหลือ zero-width space ที่ split() ไม่ถือเป็นช่องว่าง
+    # str.split() ใช้นิยามช่องว่างเดียวกับ \s ของ re → ผลเท่ากับ re.sub(r"\s+", " ", ...).strip()
     text = unicodedata.normalize("NFKC", text)
-    text = re.sub(r"[\u200B\u00A0\u202F]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return " ".join(text.replace("\u200b", " ").split())
+
+def classify_line(line: str) -> tuple[Optional[str], Optional[re.Match]]:
+    """คืน (ชนิด, match) ของบรรทัดที่ clean แล้ว: chapter / section / article / heading หรือ (None, None) = เนื้อหา"""
+    m = LINE_CLASSIFIER_RE.match(line)
+    return (m.lastgroup, m) if m else (None, None)
 
 def is_matra_number_only_line(line: str) -> bool:
-    line = clean_line(line)
-    return bool(re.fullmatch(r"[๐๑๒๓๔๕๖๗๘๙\d]{1,4}", line))
+    return bool(MATRA_NUMBER_ONLY_RE.fullmatch(clean_line(line)))
 
 def extract_standalone_matra(line: str) -> str | None:
     """ดึงเฉพาะบรรทัดที่มีแต่มาตรา + เลข ไม่มีเนื้อหาต่อท้าย"""
-    line = clean_line(line)
-    m = re.fullmatch(r"(มาตรา\s+[๐๑๒๓๔๕๖๗๘๙\d]+(?:/[๐๑๒๓๔๕๖๗๘๙\d]+)?(?: ทวิ| ตรี| จัตวา)?)", line)
+    m = STANDALONE_MATRA_RE.fullmatch(clean_line(line))
     return m.group(1) if m else None
 
 def extract_matra_at_line_start(line: str) -> str | None:
     """ดึงมาตราที่อยู่ต้นบรรทัด + มีข้อความต่อท้าย"""
-    line = clean_line(line)
-    m = re.match(r"^(มาตรา\s+[๐๑๒๓๔๕๖๗๘๙\d]+(?:/[๐๑๒๓๔๕๖๗๘๙\d]+)?(?: ทวิ| ตรี| จัตวา)?)\b", line)
+    m = MATRA_AT_LINE_START_RE.match(clean_line(line))
     return m.group(1) if m and len(m.group(0)) >= 7 else None
 
 def detect_royal_gazette_header(lines: list[str]) -> Optional[int]:
     """
     ตรวจจับตำแหน่งเริ่มต้นของหัวราชกิจจานุเบกษา (หน้า + เล่ม + ราชกิจ + วันที่)
-    คืน index เริ่มต้น (4 บรรทัด) หากเจอ
-    """
-    page_line_pattern = r"^หน้า\s+[๐-๙\d]+$"
-    header_pattern = r"""
-    ^เล่ม\s+[๐-๙\d]+\s+ตอนที่\s+[๐-๙\d]+(?:\s+[ก-ฮ])?\s+
-    ราชกิจจานุเบกษา\s+
-    [๐-๙\d]+\s+[ก-๙]+\s+[๐-๙\d]{4}$
+    คืน index ของบรรทัด "หน้า ..." ถ้ามีอยู่ก่อนหัว (ลบ 4 บรรทัด) ไม่งั้นคืน index บรรทัด "เล่ม ..." (ลบ 3 บรรทัด)
+    เลื่อนหน้าต่าง 3 บรรทัดไปรอบเดียว ต่อ string เฉพาะหน้าต่างที่ขึ้นต้นด้วย "เล่ม"
     """
+    stripped = [line.strip() for line in lines]
+    first_header = None
 
-    for i in range(len(lines) - 3):
-        # ตรวจว่าบรรทัดแรกเป็น "หน้า ..."
-        if re.fullmatch(page_line_pattern, lines[i].strip()):
-            # รวม 3 บรรทัดถัดไป
-            combined = f"{lines[i+1].strip()} {lines[i+2].strip()} {lines[i+3].strip()}"
-            if re.fullmatch(header_pattern, combined, flags=re.VERBOSE):
-                return i  # เริ่มลบตั้งแต่ "หน้า ..."
-
-    # รองรับกรณีไม่มี "หน้า ..." (ใช้แค่ 3 บรรทัด)
-    for i in range(len(lines) - 2):
-        combined = f"{lines[i].strip()} {lines[i+1].strip()} {lines[i+2].strip()}"
-        if re.fullmatch(header_pattern, combined, flags=re.VERBOSE):
-            return i  # เริ่มลบที่บรรทัดแรกของหัวราชกิจฯ
+    for i in range(len(stripped) - 2):
+        if not stripped[i].startswith("เล่ม"):
+            continue
+        if not GAZETTE_HEADER_RE.fullmatch(f"{stripped[i]} {stripped[i + 1]} {stripped[i + 2]}"):
+            continue
+        if i > 0 and GAZETTE_PAGE_RE.fullmatch(stripped[i - 1]):
+            return i - 1  # เริ่มลบตั้งแต่ "หน้า ..."
+        if first_header is None:
+            first_header = i  # กรณีไม่มี "หน้า ..." (ใช้แค่ 3 บรรทัด) ถ้าไม่เจอแบบมี "หน้า" ในหน้าเดียวกัน
 
-    return None
+    return first_header
 
 def pdf_to_markdown(pdf_path: str, mark_type: str, output_dir: str = "extracted_md") -> str:
     doc = fitz.open(pdf_path)
@@ -241,111 +273,215 @@ def clean_markdown_file(md_path: str):
         f.write(content.strip())
         f.truncate()
         
-# def law_markdown_transform(text: str, filename: str):
-def law_markdown_transform(pdf_path: str, mark_type: str = "พระราชบัญญัติ", output_dir: str = "extracted_md") -> str:
-
-    doc = fitz.open(pdf_path)
-    filename = os.path.splitext(os.path.basename(pdf_path))[0]
-    md_path = os.path.join(output_dir, f"{filename}.md")
-    os.makedirs(output_dir, exist_ok=True)
-
+def extract_page_lines(page: fitz.Page) -> list[str]:
+    """ข้อความหนึ่งหน้า: ลบหัวราชกิจจานุเบกษา (ถ้ามี) แล้ว clean_line ทุกบรรทัด (ไม่ขึ้นกับหน้าอื่น)"""
+    lines = page.get_text().splitlines()
+
+    # 🧹 ลบหัวราชกิจจานุเบกษา (ถ้ามีในหน้านี้)
+    header_index = detect_royal_gazette_header(lines)
+    if header_index is not None:
+        del lines[header_index:header_index + 4 if lines[header_index].startswith("หน้า") else header_index + 3]
+
+    return [clean_line(line) for line in lines]
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> list[list[str]]:
+    """worker ของ process pool: เปิด PDF เอง แล้วคืนบรรทัดที่ clean แล้วของหน้า [start, stop)"""
+    with fitz.open(pdf_path) as doc:
+        return [extract_page_lines(doc.load_page(number)) for number in range(start, stop)]
+
+def iter_pages_parallel(
+    pdf_path: str,
+    page_count: int,
+    workers: int,
+    progress: Optional[Callable[..., None]] = None,
+) -> Iterator[list[str]]:
+    """
+    แบ่งหน้าเป็นช่วงให้ process pool ดึงข้อความพร้อมกัน แล้วคืนทีละหน้าตามลำดับเดิม
+    ช่วงที่ส่งเข้า pool ค้างได้ไม่เกิน 2 เท่าของ workers → หน้าที่รออยู่ใน memory มีจำกัดแม้ PDF ใหญ่มาก
+    ใช้ spawn เพราะถูกเรียกจาก thread ของงาน ingest (fork ใน process ที่มีหลาย thread ไม่ปลอดภัย)
+    """
+    ranges_per_worker = 4  # ช่วงเล็กลง → worker ว่างพร้อมกันน้อยลงเมื่อบางหน้าช้า
+    max_range_pages = 32   # จำกัดขนาดช่วง (หน้าที่ค้างใน memory ≤ workers * 2 * max_range_pages)
+    size = max(1, min(-(-page_count // (workers * ranges_per_worker)), max_range_pages))
+    window = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending: deque = deque()
+        parsed = 0
+
+        def completed(future) -> list[list[str]]:
+            nonlocal parsed
+            pages = future.result()
+            parsed += len(pages)
+            if progress:
+                progress(stage="parsing", pages_parsed=parsed, pages_total=page_count)
+            return pages
+
+        try:
+            for start in range(0, page_count, size):
+                pending.append(pool.submit(extract_page_range, pdf_path, start, min(start + size, page_count)))
+                if len(pending) >= window:
+                    yield from completed(pending.popleft())
+            while pending:
+                yield from completed(pending.popleft())
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+def iter_pdf_pages(
+    pdf_path: str,
+    doc: fitz.Document,
+    workers: int = PDF_EXTRACT_WORKERS,
+    progress: Optional[Callable[..., None]] = None,
+) -> Iterator[list[str]]:
+    """บรรทัดที่ clean แล้วของแต่ละหน้า (serial จาก doc หรือ process pool ตาม workers/จำนวนหน้า)"""
+    if workers > 1 and len(doc) >= PDF_PARALLEL_MIN_PAGES:
+        yield from iter_pages_parallel(pdf_path, len(doc), workers, progress)
+        return
+    for page in doc:
+        if progress:
+            progress(stage="parsing", pages_parsed=page.number, pages_total=len(doc))
+        yield extract_page_lines(page)
+
+def iter_law_markdown(pages: Iterable[list[str]], mark_type: str) -> Iterator[str]:
+    """
+    รอบเดียวตามลำดับหน้า: ส่งต่อสถานะข้ามหน้า (buffer_line, previous_matra, first_line_mark_type)
+    แล้วคืน markdown ทีละบรรทัด — pages คือบรรทัดที่ clean แล้วของแต่ละหน้า (จาก extract_page_lines)
+    """
     buffer_line = None
     previous_matra = None
     first_line_mark_type = 0
 
-    with open(md_path, "w", encoding="utf-8") as f:
-        for page in doc:
-            lines = page.get_text().splitlines()
-            i = 0
-
-            # 🧹 ลบหัวราชกิจจานุเบกษา (ถ้ามีในหน้านี้)
-            header_index = detect_royal_gazette_header(lines)
-            if header_index is not None:
-                del lines[header_index:header_index + 4 if lines[header_index].startswith("หน้า") else header_index + 3]
-
-            while i < len(lines):
-                raw_line = lines[i]
-                line = clean_line(raw_line)
-
-                # if line.startswith("หน้า"):
-                #     i += 1
-                #     continue
+    for page_number, lines in enumerate(pages):
+        i = 0
 
-                # markdown ชนิดของเอกสาร ทำแค่หน้าแรกครั้งเดียว
-                if page.number == 0 and line.startswith(mark_type):
-                    if (first_line_mark_type == 0):
-                        f.write(f"# {mark_type}\n\n")
-                        first_line_mark_type = 1
-                        i += 1
-                        continue
+        while i < len(lines):
+            line = lines[i]
+            kind, match = classify_line(line)
 
-                # รวมหมวด + ชื่อ
-                if buffer_line:
-                    full = f"{buffer_line} {line}"
-                    if buffer_line.startswith("หมวด"):
-                        f.write(f"## {full}\n\n")
-                    elif buffer_line.startswith("ส่วนที่"):
-                        f.write(f"### {full}\n\n")
-                    buffer_line = None
+            # markdown ชนิดของเอกสาร ทำแค่หน้าแรกครั้งเดียว
+            if page_number == 0 and line.startswith(mark_type):
+                if (first_line_mark_type == 0):
+                    yield f"# {mark_type}"
+                    first_line_mark_type = 1
                     i += 1
                     continue
 
-                if re.fullmatch(r"หมวด\s+[๐๑๒๓๔๕๖๗๘๙\d]+", line):
-                    buffer_line = line
-                    i += 1
-                    continue
+            # รวมหมวด + ชื่อ
+            if buffer_line:
+                full = f"{buffer_line} {line}"
+                if buffer_line.startswith("หมวด"):
+                    yield f"## {full}"
+                elif buffer_line.startswith("ส่วนที่"):
+                    yield f"### {full}"
+                buffer_line = None
+                i += 1
+                continue
 
-                if line.startswith("ส่วนที่"):
-                    buffer_line = line
-                    i += 1
+            if kind == "chapter" or kind == "section":
+                buffer_line = line
+                i += 1
+                continue
+
+            # ✅ มาตราอยู่คนละบรรทัด: "มาตรา", "๑"
+            if line == "มาตรา" and i + 1 < len(lines) and MATRA_NUMBER_ONLY_RE.fullmatch(lines[i + 1]):
+                number = thai_digit_to_int(lines[i + 1])
+                if previous_matra is None or (number == previous_matra + 1):
+                    previous_matra = number
+                    yield f"#### มาตรา {lines[i + 1]}"
+                    i += 2
                     continue
 
-                # ✅ มาตราอยู่คนละบรรทัด: "มาตรา", "๑"
-                if line == "มาตรา" and i + 1 < len(lines) and is_matra_number_only_line(lines[i + 1]):
-                    full = f"มาตรา {clean_line(lines[i + 1])}"
-                    number = extract_matra_number(full)
-                    if previous_matra is None or (number == previous_matra + 1):
-                        previous_matra = number
-                        f.write(f"#### {full}\n\n")
-                        i += 2
-                        continue
-
-                # # ✅ มาตรา
-                matra_text = extract_standalone_matra(line)
-                if matra_text:
-                    number = extract_matra_number(matra_text)
-                    if previous_matra is None or (number == previous_matra + 1):
-                        f.write(f"#### {matra_text}\n\n")
-                        previous_matra = number
-                        after = line[len(matra_text):].strip()
-                        if after:
-                            f.write(after + "\n\n")
-                        i += 1
-                        continue
-
-                # ✅ มาตราหลักร้อย
-                partial = extract_matra_at_line_start(line)
-                if partial:
-                    number = extract_matra_number(partial)
-                    if previous_matra is None or (number == previous_matra + 1):
-                        f.write(f"#### {partial}\n\n")
-                        previous_matra = number
-                        after = line[len(partial):].strip()
-                        if after:
-                            f.write(after + "\n\n")
-                        i += 1
-                        continue
-
-                # ✅ หัวเรื่องอื่นๆ
-                if any(line.startswith(h) for h in ["บทเฉพาะกาล", "บทนิยาม", "บทกำหนดโทษ"]):
-                    f.write(f"## {line}\n\n")
+            # ✅ มาตรา (ทั้งบรรทัด หรือมีเนื้อหาต่อท้าย) ที่เลขต่อจากมาตราก่อนหน้า
+            if kind == "article":
+                matra_text = match.group("article")
+                number = thai_digit_to_int(match.group("number"))
+                if previous_matra is None or (number == previous_matra + 1):
+                    yield f"#### {matra_text}"
+                    previous_matra = number
+                    after = line[len(matra_text):].strip()
+                    if after:
+                        yield after
                     i += 1
                     continue
 
-                # ✅ เนื้อหาทั่วไป
-                f.write(line + "\n\n")
+            # ✅ หัวเรื่องอื่นๆ
+            if kind == "heading":
+                yield f"## {line}"
                 i += 1
+                continue
+
+            # ✅ เนื้อหาทั่วไป
+            yield line
+            i += 1
 
-    clean_markdown_file(md_path)
+def write_law_markdown(f, pages: Iterable[list[str]], mark_type: str):
+    """เขียน markdown จาก iter_law_markdown ลง f (ก่อน clean_markdown_file)"""
+    for line in iter_law_markdown(pages, mark_type):
+        f.write(line + "\n\n")
 
-    return md_path
\ No newline at end of file
+def clean_markdown_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    clean_markdown_file แบบทีละบรรทัด: ตัด space/tab ท้ายบรรทัด และข้ามบรรทัดว่าง
+    "\n".join(ผลลัพธ์) ได้เนื้อเดียวกับไฟล์ที่ผ่าน clean_markdown_file (บรรทัดจาก iter_law_markdown ไม่มีช่องว่างนำหน้า)
+    """
+    for line in lines:
+        line = line.rstrip(" \t")
+        if line:
+            yield line
+
+def verify_markdown_lines(lines: Iterator[str], serial_lines: Iterator[str], label: str) -> Iterator[str]:
+    """
+    เทียบ markdown แบบ parallel กับ serial ทีละบรรทัดขณะ stream
+    บรรทัดที่ส่งออกไปแล้วตรงกันทั้งคู่ → ถ้าเจอบรรทัดแรกที่ไม่ตรง ส่งต่อด้วยผลของ serial ได้เลย (เหมือนใช้ไฟล์ serial แทน)
+    """
+    for line in lines:
+        expected = next(serial_lines, None)
+        if line != expected:
+            break
+        yield line
+    else:
+        expected = next(serial_lines, None)
+        if expected is None:
+            print(f"✅ markdown แบบ parallel ตรงกับ serial: {label}")
+            return
+    lines.close()
+    print(f"❗ markdown แบบ parallel ไม่ตรงกับ serial ใช้ผลของ serial แทน: {label}")
+    if expected is not None:
+        yield expected
+    yield from serial_lines
+
+def stream_law_markdown(
+    pdf_path: str,
+    mark_type: str = "พระราชบัญญัติ",
+    output_dir: Optional[str] = None,
+    progress: Optional[Callable[..., None]] = None,
+    doc: Optional[fitz.Document] = None,
+    workers: int = PDF_EXTRACT_WORKERS,
+    verify: bool = PDF_EXTRACT_VERIFY,
+) -> Iterator[str]:
+    """
+    PDF → markdown ทีละบรรทัดใน memory (หน้า → บรรทัด markdown → ตัดช่องว่าง) ไม่ต้องเขียนแล้วอ่านไฟล์
+    ถือไว้แค่หน้าที่กำลังแปลง (หรือช่วงหน้าที่ค้างใน pool) จึงใช้ memory คงที่แม้ PDF ใหญ่มาก
+    - doc → ใช้ handle ที่เปิดไว้แล้ว (เช่นจาก route_markdown_stream) generator จะปิดให้เมื่อจบ
+    - output_dir → เขียนไฟล์ markdown ไปพร้อมกัน (เนื้อเดียวกับไฟล์ที่ผ่าน clean_markdown_file) ไว้ตรวจดู
+    - verify → เทียบผล parallel กับ serial ทีละบรรทัด (ถ้าไม่ตรงจะใช้ผลของ serial)
+    """
+    with doc if doc is not None else fitz.open(pdf_path) as doc:
+        parallel = workers > 1 and len(doc) >= PDF_PARALLEL_MIN_PAGES
+        lines = clean_markdown_lines(iter_law_markdown(iter_pdf_pages(pdf_path, doc, workers, progress), mark_type))
+        if verify and parallel:
+            serial_lines = clean_markdown_lines(iter_law_markdown((extract_page_lines(page) for page in doc), mark_type))
+            lines = verify_markdown_lines(lines, serial_lines, pdf_path)
+        if output_dir is None:
+            yield from lines
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+            md_path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(pdf_path))[0]}.md")
+            with open(md_path, "w", encoding="utf-8") as f:
+                for n, line in enumerate(lines):
+                    f.write(f"\n{line}" if n else line)
+                    yield line
+        if progress:
+            progress(pages_parsed=len(doc))
@@ -1,53 +1,74 @@
-import shutil
+import os
 import hashlib
+import tempfile
 from pathlib import Path
 from datetime import datetime
+from typing import NamedTuple
 from fastapi import UploadFile
 from fastapi import HTTPException
-from langchain_community.document_loaders import PyMuPDFLoader
 
 UPLOAD_DIR = Path("external_data")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-def get_file_info(file: UploadFile, file_path: Path):
-    file.file.seek(0)
-    file_hash = hashlib.md5(file.file.read()).hexdigest()
-    file.file.seek(0)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-    timestamp = datetime.utcnow().isoformat()
-    filesize = file_path.stat().st_size  # ✅ ใช้ os path stat หลัง save
+class UploadedFile(NamedTuple):
+    path: Path        # ไฟล์ชั่วคราว (<ชื่อไฟล์>.<สุ่ม>.part) จนกว่าจะ commit_upload
+    filename: str
+    sha256: str
+    filesize: int
+    timestamp: str
 
-    return file_hash, timestamp, filesize
-
-def get_file_hash(file: UploadFile) -> str:
-    hasher = hashlib.md5()
-    content = file.file.read()
-    hasher.update(content)
-    file.file.seek(0)  # Reset file pointer after read
-    return hasher.hexdigest()
-
-def upload_documents(file: UploadFile):
+def upload_documents(file: UploadFile) -> UploadedFile:
+    """
+    เขียนไฟล์ที่อัปโหลดลงดิสก์แบบ stream ทีละ chunk พร้อมคำนวณ SHA-256 ไปด้วย (อ่านไฟล์รอบเดียว)
+    เกิน MAX_UPLOAD_BYTES → 413 และลบไฟล์ที่เขียนไปแล้ว
+    ไฟล์ถูกเขียนเป็น .part ก่อน ให้ผู้เรียกตัดสินใจ commit_upload (เก็บ) หรือ discard_upload (เช่น ไฟล์ซ้ำ)
+    ชื่อ .part สุ่มต่ออัปโหลด อัปโหลดชื่อเดียวกันพร้อมกันจึงไม่เขียนทับไฟล์ของกันและกัน
+    """
     # ตรวจสอบว่าเป็นไฟล์ PDF หรือไม่
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="ไฟล์ต้องเป็น PDF เท่านั้น")
-    
-    file_path = UPLOAD_DIR / file.filename
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
 
-    # ✅ คำนวณหลังจากเขียนไฟล์ลงดิสก์
-    file_hash, timestamp, filesize = get_file_info(file, file_path)
+    filename = Path(file.filename).name
+    hasher = hashlib.sha256()
+    filesize = 0
 
-    loader = PyMuPDFLoader(str(file_path))
-    documents = loader.load()
+    # อยู่ใน UPLOAD_DIR เดียวกับไฟล์จริง → os.replace ตอน commit เป็น atomic
+    buffer = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, prefix=f"{filename}.", suffix=".part", delete=False)
+    part_path = Path(buffer.name)
+    try:
+        with buffer:
+            while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+                filesize += len(chunk)
+                if filesize > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"ไฟล์ใหญ่เกิน {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+                    )
+                hasher.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
 
-    for doc in documents:
-        doc.metadata.update({
-            "source": str(file_path),
-            "file_hash": file_hash,
-            "timestamp": timestamp,
-            "filesize": filesize
-        })
+    return UploadedFile(
+        path=part_path,
+        filename=filename,
+        sha256=hasher.hexdigest(),
+        filesize=filesize,
+        timestamp=datetime.utcnow().isoformat(),
+    )
 
+def commit_upload(uploaded: UploadedFile) -> Path:
+    """
+    ย้ายไฟล์ .part ไปเป็นไฟล์จริงใน UPLOAD_DIR ชื่อ "<ชื่อไฟล์>.<sha256[:12]>.pdf"
+    ชื่อผูกกับเนื้อไฟล์ → อัปโหลดชื่อเดียวกันแต่เนื้อต่างกันไม่ทับไฟล์ที่งาน ingest ก่อนหน้ากำลังอ่านอยู่
+    """
+    file_path = UPLOAD_DIR / f"{Path(uploaded.filename).stem}.{uploaded.sha256[:12]}.pdf"
+    os.replace(uploaded.path, file_path)
     return file_path
 
+def discard_upload(uploaded: UploadedFile):
+    uploaded.path.unlink(missing_ok=True)
@@ -1,5 +1,6 @@
 import fitz  # PyMuPDF
-from app.documents.file_markdown import law_markdown_transform
+from typing import Callable, Iterator, Optional
+from app.documents.file_markdown import stream_law_markdown
 
 def detect_document_type_from_file(pdf_path: str) -> str:
     doc = fitz.open(pdf_path)
@@ -66,26 +67,27 @@ def detect_document_type(text: str) -> DocumentType:
     else:
         return "unknown"
     
-def route_markdown_transform(pdf_path: str) -> str:
-    doc = fitz.open(pdf_path)
+def detect_pdf_type(doc: fitz.Document) -> str:
     first_page = doc.load_page(0).get_text()
 
     # Clean text for matching
     text = first_page.strip().replace("\u200b", "").replace("\n", " ")
-    doc_type = detect_document_type(text)
+    return detect_document_type(text)
 
-    markdown = ""
+def route_markdown_stream(
+    pdf_path: str,
+    progress: Optional[Callable[..., None]] = None,
+    output_dir: Optional[str] = None,
+) -> tuple[Iterator[str], str]:
+    """
+    ตรวจประเภทเอกสารแล้วคืน markdown เป็น generator ทีละบรรทัด (ไม่ผ่านไฟล์) พร้อมประเภทเอกสาร
+    output_dir → เขียนไฟล์ markdown ไว้ดูไปพร้อมกัน, ประเภทที่ยังไม่รองรับได้ generator ว่าง
+    PDF เปิดครั้งเดียว: handle ที่ใช้ตรวจประเภทส่งต่อให้ generator ซึ่งจะปิดเมื่อ stream จบ
+    """
+    doc = fitz.open(pdf_path)
+    doc_type = detect_pdf_type(doc)
 
     if doc_type == "law":
-        markdown = law_markdown_transform(pdf_path)  # แยกตามมาตรา
-    # elif doc_type == "memo":
-    #     return memo_markdown_transform(text)  # แยกตามหัวข้อราชการ
-    # elif doc_type == "announcement":
-    #     return announcement_markdown_transform(text)  # มีเลขประกาศ
-    # elif doc_type == "article":
-    #     return article_markdown_transform(text)  # Markdown ธรรมดา
-    # else:
-    #     print("⚠️ ไม่สามารถระบุประเภทเอกสารได้ ส่งแบบ default")
-    #     return default_markdown_transform(text)
-
-    return markdown, doc_type
+        return stream_law_markdown(pdf_path, output_dir=output_dir, progress=progress, doc=doc), doc_type  # แยกตามมาตรา
+    doc.close()
+    return iter(()), doc_type
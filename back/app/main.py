@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import chat_session, upload, search_rag, llm
+from app.routers import chat_session, upload, search_rag, llm, cache
+
+# header ที่ endpoint RAG ใช้รายงานข้อมูลประกอบ (ให้ browser อ่านได้)
+RAG_RESPONSE_HEADERS = ["X-RAG-Contexts", "X-RAG-Pruned", "X-RAG-Context-Tokens", "X-RAG-Context-Budget", "X-RAG-Cache"]
 
 # --- FastAPI app ---
 app = FastAPI(title="RAG and Chat API Service")
@@ -12,9 +15,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=RAG_RESPONSE_HEADERS,
 )
 
 app.include_router(llm.router, prefix="/apib")
 app.include_router(upload.router, prefix="/apib")
 app.include_router(search_rag.router, prefix="/apib")
-app.include_router(chat_session.router, prefix="/apib")
\ No newline at end of file
+app.include_router(chat_session.router, prefix="/apib")
+app.include_router(cache.router, prefix="/apib")
\ No newline at end of file
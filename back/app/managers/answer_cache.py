@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+from app.managers.db_manager import db_manager
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))  # ต่อ collection
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    created_at: float
+    last_hit_at: float
+    settings: Hashable = None  # model + ค่าการค้นที่ใช้สร้างคำตอบนี้
+
+
+@dataclass
+class CollectionAnswers:
+    index_version: int
+    vectors: np.ndarray  # (n, dim) normalize แล้ว
+    answers: List[CachedAnswer] = field(default_factory=list)
+
+
+def normalize_vector(vector) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class SemanticAnswerCache:
+    """
+    Cache คำตอบ RAG ตามความคล้ายของคำถาม (cosine ของ dense embedding) แยกตาม collection
+    entry ผูกกับ index version ของ collection → ถ้า collection ถูก index ใหม่ entry ทั้งหมดจะถูกทิ้ง
+    settings (model, ค่าการค้น ฯลฯ) ต้องตรงกันทุกค่า คำตอบที่สร้างจาก model หรือบริบทต่างกันจึงไม่ถูกใช้แทนกัน
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._collections: Dict[str, CollectionAnswers] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self,
+        collection_name: str,
+        query_vector,
+        threshold: Optional[float] = None,
+        settings: Hashable = None,
+    ) -> Optional[CachedAnswer]:
+        threshold = self.threshold if threshold is None else threshold
+        query = normalize_vector(query_vector)
+        now = time.time()
+
+        with self._lock:
+            entry = self._current(collection_name)
+            if entry is None or not entry.answers:
+                self.misses += 1
+                return None
+
+            candidates = [i for i, answer in enumerate(entry.answers) if answer.settings == settings]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            similarities = entry.vectors[candidates] @ query
+            best = int(np.argmax(similarities))
+            cached = entry.answers[candidates[best]]
+            if similarities[best] < threshold or now - cached.created_at > self.ttl_seconds:
+                self.misses += 1
+                return None
+
+            cached.last_hit_at = now
+            self.hits += 1
+            print(f"🎯 answer cache hit ({similarities[best]:.3f}) '{collection_name}': {cached.question}")
+            return cached
+
+    def store(
+        self,
+        collection_name: str,
+        query_vector,
+        question: str,
+        answer: str,
+        index_version: int,
+        settings: Hashable = None,
+    ):
+        """เก็บคำตอบ โดย index_version ต้องเป็น version ตอนเริ่มค้นหา (คำตอบจาก index เก่าจะไม่ถูกเก็บ)"""
+        vector = normalize_vector(query_vector)
+        now = time.time()
+
+        with self._lock:
+            if index_version != db_manager.get_index_version(collection_name):
+                return
+            entry = self._current(collection_name)
+            if entry is None:
+                entry = CollectionAnswers(index_version=index_version, vectors=np.empty((0, vector.shape[0]), dtype=np.float32))
+                self._collections[collection_name] = entry
+
+            entry.vectors = np.vstack([entry.vectors, vector])
+            entry.answers.append(
+                CachedAnswer(question=question, answer=answer, created_at=now, last_hit_at=now, settings=settings)
+            )
+
+            if len(entry.answers) > self.max_entries:
+                # ทิ้งรายการที่ถูกใช้ล่าสุดนานที่สุด
+                oldest = min(range(len(entry.answers)), key=lambda i: entry.answers[i].last_hit_at)
+                entry.vectors = np.delete(entry.vectors, oldest, axis=0)
+                del entry.answers[oldest]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "collections": {name: len(entry.answers) for name, entry in self._collections.items()},
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _current(self, collection_name: str) -> Optional[CollectionAnswers]:
+        # เรียกภายใต้ lock เท่านั้น
+        entry = self._collections.get(collection_name)
+        if entry is not None and entry.index_version != db_manager.get_index_version(collection_name):
+            print(f"🔄 ล้าง answer cache ของ '{collection_name}' (index version เปลี่ยน)")
+            del self._collections[collection_name]
+            return None
+        return entry
+
+
+# Singleton instance
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL,
+)
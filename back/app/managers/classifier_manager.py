@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+
+from app.managers.db_manager import db_manager
+from app.managers.local_llm_manager import llm_manager
+from app.prompts.classifier_prompts import CLASSIFICATION_EXAMPLES, build_classification_prompt
+
+Category = Literal["ทั่วไป", "กฎหมาย", "สวัสดิการ", "แบบฟอร์ม"]
+
+CLASSIFIER_EXAMPLES_PATH = os.getenv("CLASSIFIER_EXAMPLES_PATH")  # jsonl: {"question": ..., "label": ...}
+CLASSIFIER_MIN_SIMILARITY = float(os.getenv("CLASSIFIER_MIN_SIMILARITY", "0.6"))
+CLASSIFIER_MIN_MARGIN = float(os.getenv("CLASSIFIER_MIN_MARGIN", "0.05"))
+# ชั้น embedding เปิดเมื่อไฟล์ตัวอย่างมีอย่างน้อยเท่านี้ทุกหมวด (ตัวอย่างในตัว prompt หมวดละข้อเดียว ไม่พอทำ centroid)
+CLASSIFIER_MIN_EXAMPLES_PER_CLASS = int(os.getenv("CLASSIFIER_MIN_EXAMPLES_PER_CLASS", "20"))
+
+GREETING_KEYWORDS = ["สวัสดี", "ขอบคุณ", "บาย", "ทดสอบ", "hello", "hi", "คุณชื่ออะไร"]
+CATEGORIES = ("ทั่วไป", "กฎหมาย", "สวัสดิการ")
+
+
+def is_general_question(prompt: str) -> bool:
+    return any(word in prompt.lower() for word in GREETING_KEYWORDS)
+
+
+def parse_llm_category(result: str) -> Category:
+    if "ทั่วไป" in result:
+        return "ทั่วไป"
+    elif "สวัสดิการ" in result:
+        return "สวัสดิการ"
+    else:
+        return "กฎหมาย"
+
+
+def load_labeled_examples(path: Optional[str]) -> List[Tuple[str, str]]:
+    """โหลดตัวอย่างที่ติด label แล้วจากไฟล์ jsonl (ข้ามบรรทัดที่ label ไม่รู้จัก)"""
+    if not path:
+        return []
+    file_path = Path(path)
+    if not file_path.exists():
+        print(f"❗ ไม่พบไฟล์ตัวอย่าง classifier: {path}")
+        return []
+
+    examples = []
+    for line in file_path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if row.get("label") in CATEGORIES and row.get("question"):
+            examples.append((row["question"], row["label"]))
+    return examples
+
+
+class QuestionClassifier:
+    """
+    จำแนกหมวดคำถามแบบหลายชั้น
+    1. keyword (GREETING_KEYWORDS)
+    2. nearest centroid บน embedding bge-m3 ของตัวอย่างที่ติด label
+       (เปิดเมื่อ CLASSIFIER_EXAMPLES_PATH มีตัวอย่างถึง CLASSIFIER_MIN_EXAMPLES_PER_CLASS ทุกหมวด)
+    3. few-shot LLM เมื่อชั้นที่ 2 ปิดอยู่หรือไม่มั่นใจ
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_classifier()
+        return cls._instance
+
+    def _init_classifier(self):
+        self.min_similarity = CLASSIFIER_MIN_SIMILARITY
+        self.min_margin = CLASSIFIER_MIN_MARGIN
+        labeled = load_labeled_examples(CLASSIFIER_EXAMPLES_PATH)
+        self.examples = list(CLASSIFICATION_EXAMPLES) + labeled
+        per_class = {category: sum(label == category for _, label in labeled) for category in CATEGORIES}
+        self.embedding_enabled = min(per_class.values()) >= CLASSIFIER_MIN_EXAMPLES_PER_CLASS
+        if not self.embedding_enabled:
+            print(f"ℹ️ ปิด embedding classifier: ตัวอย่างต่อหมวด {per_class} < {CLASSIFIER_MIN_EXAMPLES_PER_CLASS} → ใช้ LLM")
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._build_lock = asyncio.Lock()
+        self.tier_hits: Dict[str, int] = {"keyword": 0, "embedding": 0, "llm": 0}
+
+    async def classify(self, prompt: str, query_vectors: Optional[asyncio.Future] = None) -> Category:
+        """query_vectors = task ของ (dense, sparse) ที่กำลัง embed คำถามนี้อยู่ (ถ้ามี) → ใช้ dense ร่วม ไม่ embed ซ้ำ"""
+        if is_general_question(prompt):
+            self.tier_hits["keyword"] += 1
+            return "ทั่วไป"
+
+        category = await self.classify_by_embedding(prompt, query_vectors) if self.embedding_enabled else None
+        if category is not None:
+            self.tier_hits["embedding"] += 1
+            return category
+
+        self.tier_hits["llm"] += 1
+        return await self.classify_by_llm(prompt)
+
+    async def classify_by_embedding(self, prompt: str, query_vectors: Optional[asyncio.Future] = None) -> Optional[Category]:
+        """คืนหมวดเมื่อมั่นใจพอ (similarity และ margin ถึงเกณฑ์) ไม่งั้นคืน None"""
+        try:
+            centroids = await self._get_centroids()
+            if query_vectors is not None:
+                # shield: task นี้ใช้ร่วมกับการค้นแบบ speculative ห้ามถูกยกเลิกจากฝั่ง classifier
+                vector = (await asyncio.shield(query_vectors))[0]
+            else:
+                # query embedding ผ่าน cache เดียวกับที่ใช้ค้นเอกสาร
+                vector = await db_manager.dense_embeddings.aembed_query(prompt)
+            query = np.asarray(vector, dtype=np.float32)
+        except Exception as e:
+            print(f"❗ embedding classifier ใช้งานไม่ได้: {e}")
+            return None
+
+        query /= np.linalg.norm(query) or 1.0
+        similarities = centroids @ query
+        order = np.argsort(similarities)[::-1]
+        best = float(similarities[order[0]])
+        margin = best - float(similarities[order[1]]) if len(order) > 1 else best
+
+        if best < self.min_similarity or margin < self.min_margin:
+            return None
+        return self._labels[order[0]]
+
+    async def classify_by_llm(self, prompt: str) -> Category:
+        few_shot_prompt = build_classification_prompt(prompt)
+
+        result = ""
+        async for chunk in llm_manager.llm.astream(few_shot_prompt):
+            result += chunk
+
+        return parse_llm_category(result)
+
+    def stats(self) -> dict:
+        total = sum(self.tier_hits.values())
+        return {
+            "tier_hits": dict(self.tier_hits),
+            "llm_rate": self.tier_hits["llm"] / total if total else 0.0,
+            "examples": len(self.examples),
+            "embedding_enabled": self.embedding_enabled,
+            "min_similarity": self.min_similarity,
+            "min_margin": self.min_margin,
+        }
+
+    async def _get_centroids(self) -> np.ndarray:
+        if self._centroids is not None:
+            return self._centroids
+        async with self._build_lock:
+            if self._centroids is None:
+                questions = [question for question, _ in self.examples]
+                vectors = np.asarray(await db_manager.dense_embeddings.aembed_documents(questions), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                labels = [label for _, label in self.examples]
+
+                self._labels = [c for c in CATEGORIES if c in labels]
+                centroids = np.stack([
+                    vectors[[i for i, label in enumerate(labels) if label == category]].mean(axis=0)
+                    for category in self._labels
+                ])
+                centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+                self._centroids = centroids
+                print(f"✅ สร้าง centroid ของ classifier จาก {len(questions)} ตัวอย่าง ({', '.join(self._labels)})")
+        return self._centroids
+
+
+# Singleton instance
+question_classifier = QuestionClassifier()
@@ -1,8 +1,22 @@
+import asyncio
 from collections import OrderedDict
-from typing import Dict, List, Tuple
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Literal, NamedTuple, Optional, Tuple
 from langchain_ollama import OllamaEmbeddings
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
 from langchain_qdrant import FastEmbedSparse, QdrantVectorStore, RetrievalMode
+from app.managers.parent_cache import ParentDocumentCache
+from app.managers.document_store import IngestedFileRegistry, ParentDocumentStore
+from app.managers.vector_backend import NUMPY_INDEX_MAX_POINTS, VECTOR_BACKEND, NumpyHybridIndex, create_clients
+from app.managers.embedding_cache import (
+    CachedDenseEmbeddings,
+    CachedSparseEmbeddings,
+    TTLLRUCache,
+    decode_dense_vector,
+    decode_sparse_vector,
+    encode_dense_vector,
+    encode_sparse_vector,
+)
 
 import os
 from dotenv import load_dotenv
@@ -11,6 +25,69 @@ load_dotenv()
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
 QDRANT_HOST = os.getenv("QDRANT_HOST", "http://qdrant:6333")
+PARENT_CACHE_MAX_BYTES = int(os.getenv("PARENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PARENT_STORE_PATH = os.getenv("PARENT_STORE_PATH", "parent_store/parents.sqlite")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # เช่น "cache/embeddings.sqlite" (ไม่กำหนด = เก็บแค่ใน memory)
+PARENT_GROUP_PREFETCH_FACTOR = int(os.getenv("PARENT_GROUP_PREFETCH_FACTOR", "4"))
+COLLECTION_SEARCH_TIMEOUT = float(os.getenv("COLLECTION_SEARCH_TIMEOUT", "5"))  # วินาที ต่อ collection
+COLLECTION_RRF_K = int(os.getenv("COLLECTION_RRF_K", "60"))  # ค่า k ของ RRF ตอนรวมผลหลาย collection
+# จำนวน candidate ที่ดึงจาก vector ที่ quantize แล้วต่อ limit ก่อน rescore ด้วย vector ต้นฉบับ
+SCALAR_OVERSAMPLING = float(os.getenv("SCALAR_OVERSAMPLING", "1.5"))
+BINARY_OVERSAMPLING = float(os.getenv("BINARY_OVERSAMPLING", "3.0"))
+
+DENSE_MODEL = "bge-m3:latest"
+SPARSE_MODEL = "Qdrant/bm25"
+
+FusionType = Literal["rrf", "dbsf"]
+FUSIONS: Dict[str, models.Fusion] = {
+    "rrf": models.Fusion.RRF,    # Reciprocal Rank Fusion ใช้แค่อันดับ
+    "dbsf": models.Fusion.DBSF,  # Distribution-Based Score Fusion ปรับ score แต่ละฝั่งให้อยู่ช่วงเดียวกันก่อนรวม
+}
+
+# payload ที่ต้องใช้สำหรับผลค้นหาแบบย่อ (ไม่ดึง page_content)
+CHUNK_REF_PAYLOAD = models.PayloadSelectorInclude(include=["metadata.parent_id", "metadata.chunk_id"])
+
+class ScoredChunk(NamedTuple):
+    """ผลค้นหาแบบย่อ: อ้างถึง chunk ด้วย parent_id + chunk_id โดยไม่สร้าง Document"""
+    parent_id: Optional[str]
+    chunk_id: Optional[int]
+    score: float
+
+@dataclass
+class HybridSearchParams:
+    """
+    ค่าปรับแต่ง hybrid search ที่ยิง Query API ของ Qdrant ตรง
+    dense_limit / sparse_limit = จำนวน candidate ของแต่ละฝั่งก่อน fusion
+    score_threshold = parent ต้องได้ score มากกว่าค่านี้ (score > threshold) ถึงจะถูกเก็บ
+    """
+    dense_limit: int = 20
+    sparse_limit: int = 20
+    fusion: FusionType = "rrf"
+    score_threshold: Optional[float] = None
+
+    @classmethod
+    def for_limit(cls, limit: int, **overrides) -> "HybridSearchParams":
+        """ค่าเริ่มต้นที่ prefetch เผื่อตาม PARENT_GROUP_PREFETCH_FACTOR"""
+        prefetch = limit * PARENT_GROUP_PREFETCH_FACTOR
+        values = {"dense_limit": prefetch, "sparse_limit": prefetch}
+        values.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**values)
+
+HybridVectors = Tuple[List[float], models.SparseVector]
+
+class ParentGroups(NamedTuple):
+    """parent ที่ผ่าน score_threshold (score มาก → น้อย) และจำนวน parent ที่เกณฑ์ตัดทิ้ง"""
+    parents: "OrderedDict[str, float]"
+    pruned: int
+
+class ParentHit(NamedTuple):
+    """parent จากการค้นหลาย collection: score = score RRF จากอันดับใน collection, raw_score = score เดิมของ collection นั้น"""
+    collection_name: str
+    parent_id: str
+    score: float
+    raw_score: float
 
 class VectorDBManager:
     _instance = None
@@ -23,26 +100,53 @@ class VectorDBManager:
     
     def _init_resources(self):
         """Initialize all resources once"""
-        self.client = QdrantClient(url=QDRANT_HOST)
+        self.client, self.async_client = create_clients(VECTOR_BACKEND, QDRANT_HOST)
         self.vector_stores: Dict[str, QdrantVectorStore] = {}
         self._dense_embeddings = None
         self._sparse_embeddings = None
+        self.index_versions: Dict[str, int] = {}
+        self.parent_cache = ParentDocumentCache(max_bytes=PARENT_CACHE_MAX_BYTES)
+        self.parent_store = ParentDocumentStore(PARENT_STORE_PATH)
+        self.file_registry = IngestedFileRegistry(PARENT_STORE_PATH)
+        self.dense_search_params: Dict[str, Optional[models.SearchParams]] = {}
+        self.numpy_indexes: Dict[str, Optional[NumpyHybridIndex]] = {}
+        self._numpy_index_lock = asyncio.Lock()
     
     @property
-    def dense_embeddings(self) -> OllamaEmbeddings:
-        """Lazy initialization of dense embeddings"""
+    def dense_embeddings(self) -> CachedDenseEmbeddings:
+        """Lazy initialization of dense embeddings (query ถูก cache แบบ LRU + TTL)"""
         if self._dense_embeddings is None:
-            self._dense_embeddings = OllamaEmbeddings(
-                model="bge-m3:latest",
-                base_url=OLLAMA_HOST
+            self._dense_embeddings = CachedDenseEmbeddings(
+                OllamaEmbeddings(
+                    model=DENSE_MODEL,
+                    base_url=OLLAMA_HOST
+                ),
+                TTLLRUCache(
+                    EMBEDDING_CACHE_SIZE,
+                    EMBEDDING_CACHE_TTL,
+                    EMBEDDING_CACHE_PATH,
+                    namespace=f"dense:{DENSE_MODEL}",
+                    encode=encode_dense_vector,
+                    decode=decode_dense_vector,
+                ),
             )
         return self._dense_embeddings
     
     @property
-    def sparse_embeddings(self) -> FastEmbedSparse:
-        """Lazy initialization of sparse embeddings"""
+    def sparse_embeddings(self) -> CachedSparseEmbeddings:
+        """Lazy initialization of sparse embeddings (query ถูก cache แบบ LRU + TTL)"""
         if self._sparse_embeddings is None:
-            self._sparse_embeddings = FastEmbedSparse(model_name="Qdrant/bm25")
+            self._sparse_embeddings = CachedSparseEmbeddings(
+                FastEmbedSparse(model_name=SPARSE_MODEL),
+                TTLLRUCache(
+                    EMBEDDING_CACHE_SIZE,
+                    EMBEDDING_CACHE_TTL,
+                    EMBEDDING_CACHE_PATH,
+                    namespace=f"sparse:{SPARSE_MODEL}",
+                    encode=encode_sparse_vector,
+                    decode=decode_sparse_vector,
+                ),
+            )
         return self._sparse_embeddings
     
     def get_embedding(self, embedding_type: str = "dense"):
@@ -58,12 +162,20 @@ class VectorDBManager:
         else:
             raise ValueError(f"Unknown embedding type: {embedding_type}")
     
+    def resolve_collection(self, collection_name: str) -> str:
+        """ชื่อ collection จริงที่ alias ชี้อยู่ (ถ้าไม่ใช่ alias คืนชื่อเดิม)"""
+        aliases = {alias.alias_name: alias.collection_name for alias in self.client.get_aliases().aliases}
+        return aliases.get(collection_name, collection_name)
+
     def get_vectorstore(self, collection_name: str) -> QdrantVectorStore:
-        """Get or create vector store for a collection"""
+        """
+        Get or create vector store for a collection
+        ผูกกับ collection จริงที่ alias ชี้อยู่ตอนสร้าง → คำขอที่ถือ store เดิมอยู่ระหว่างสลับ alias ยังค้น version เดิมได้
+        """
         if collection_name not in self.vector_stores:
             self.vector_stores[collection_name] = QdrantVectorStore(
                 client=self.client,
-                collection_name=collection_name,
+                collection_name=self.resolve_collection(collection_name),
                 embedding=self.dense_embeddings,
                 sparse_embedding=self.sparse_embeddings,
                 retrieval_mode=RetrievalMode.HYBRID,
@@ -71,6 +183,235 @@ class VectorDBManager:
                 sparse_vector_name="sparse",
             )
         return self.vector_stores[collection_name]
+
+    async def aembed_hybrid_query(self, query: str) -> Tuple[List[float], models.SparseVector]:
+        """embed dense (Ollama) และ sparse (BM25) ของคำถามพร้อมกัน"""
+        dense_vector, sparse_vector = await asyncio.gather(
+            self.dense_embeddings.aembed_query(query),
+            self.sparse_embeddings.aembed_query(query),
+        )
+        return dense_vector, models.SparseVector(indices=sparse_vector.indices, values=sparse_vector.values)
+
+    async def aget_dense_search_params(self, collection_name: str) -> Optional[models.SearchParams]:
+        """
+        SearchParams ของ prefetch ฝั่ง dense ตาม quantization ของ collection (อ่านครั้งเดียวแล้ว cache)
+        collection ที่ quantize ไว้จะค้นบน vector ที่ quantize แล้ว rescore ด้วย vector ต้นฉบับ
+        """
+        if collection_name not in self.dense_search_params:
+            info = await self.async_client.get_collection(collection_name)
+            vectors_config = info.config.params.vectors
+            dense_config = vectors_config.get("dense") if isinstance(vectors_config, dict) else vectors_config
+            quantization = (dense_config and dense_config.quantization_config) or info.config.quantization_config
+
+            if isinstance(quantization, models.BinaryQuantization):
+                oversampling = BINARY_OVERSAMPLING
+            elif quantization is not None:
+                oversampling = SCALAR_OVERSAMPLING
+            else:
+                oversampling = None
+
+            self.dense_search_params[collection_name] = oversampling and models.SearchParams(
+                quantization=models.QuantizationSearchParams(rescore=True, oversampling=oversampling)
+            )
+        return self.dense_search_params[collection_name]
+
+    async def aget_numpy_index(self, collection_name: str) -> Optional[NumpyHybridIndex]:
+        """
+        index NumPy ใน memory ของ collection ที่เล็กกว่า NUMPY_INDEX_MAX_POINTS (สร้างครั้งแรกที่ค้น)
+        คืน None เมื่อปิดใช้งานหรือ collection ใหญ่เกิน → ค้นผ่าน Qdrant ตามปกติ
+        """
+        if NUMPY_INDEX_MAX_POINTS <= 0:
+            return None
+        if collection_name in self.numpy_indexes:
+            return self.numpy_indexes[collection_name]
+
+        async with self._numpy_index_lock:
+            if collection_name not in self.numpy_indexes:
+                count = (await self.async_client.count(collection_name, exact=True)).count
+                index = None
+                if 0 < count <= NUMPY_INDEX_MAX_POINTS:
+                    points = []
+                    offset = None
+                    while True:
+                        batch, offset = await self.async_client.scroll(
+                            collection_name=collection_name,
+                            limit=256,
+                            offset=offset,
+                            with_payload=CHUNK_REF_PAYLOAD,
+                            with_vectors=["dense", "sparse"],
+                        )
+                        points.extend(batch)
+                        if offset is None:
+                            break
+                    index = NumpyHybridIndex(points)
+                    print(f"🧮 โหลด '{collection_name}' เข้า NumPy index ({index.size} points)")
+                self.numpy_indexes[collection_name] = index
+        return self.numpy_indexes[collection_name]
+
+    def build_hybrid_query(
+        self,
+        vectors: HybridVectors,
+        params: HybridSearchParams,
+        dense_search_params: Optional[models.SearchParams] = None,
+    ) -> dict:
+        """prefetch dense/sparse แยก limit แล้ว fusion ฝั่ง server (RRF หรือ DBSF)"""
+        dense_vector, sparse_vector = vectors
+        if params.fusion not in FUSIONS:
+            raise ValueError(f"Unknown fusion: {params.fusion}")
+        return {
+            "prefetch": [
+                models.Prefetch(using="dense", query=dense_vector, limit=params.dense_limit, params=dense_search_params),
+                models.Prefetch(using="sparse", query=sparse_vector, limit=params.sparse_limit),
+            ],
+            "query": models.FusionQuery(fusion=FUSIONS[params.fusion]),
+        }
+
+    async def ahybrid_search(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int = 10,
+        params: Optional[HybridSearchParams] = None,
+        vectors: Optional[HybridVectors] = None,
+    ) -> List[ScoredChunk]:
+        """
+        Hybrid search ผ่าน Query API โดยตรง (หรือ NumPy index) คืน (parent_id, chunk_id, score) แบบย่อ
+        ส่ง vectors ที่ embed ไว้แล้วมาได้ เพื่อไม่ต้อง embed ซ้ำ, score_threshold ของ params → เก็บเฉพาะ score > threshold
+        """
+        params = params or HybridSearchParams.for_limit(limit)
+        vectors = vectors or await self.aembed_hybrid_query(query)
+
+        numpy_index = await self.aget_numpy_index(collection_name)
+        if numpy_index is not None:
+            points = numpy_index.search(vectors, params, limit)
+        else:
+            response = await self.async_client.query_points(
+                collection_name=collection_name,
+                limit=limit,
+                with_payload=CHUNK_REF_PAYLOAD,
+                with_vectors=False,
+                **self.build_hybrid_query(vectors, params, await self.aget_dense_search_params(collection_name)),
+            )
+            points = response.points
+
+        return [
+            scored_chunk_from_point(point)
+            for point in points
+            if params.score_threshold is None or point.score > params.score_threshold
+        ]
+
+    async def asearch_parent_groups(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int = 10,
+        params: Optional[HybridSearchParams] = None,
+        vectors: Optional[HybridVectors] = None,
+    ) -> ParentGroups:
+        """
+        Hybrid search ที่ให้ Qdrant จัดกลุ่มตาม metadata.parent_id ฝั่ง server (query_points_groups)
+        คืน parent ที่ไม่ซ้ำกันไม่เกิน limit ตัว พร้อม score ที่ดีที่สุดของแต่ละ parent เรียงจากมากไปน้อย
+        score_threshold ของ params ใช้กับกลุ่มที่ได้ (ยังไม่มีการดึง chunk) จึงนับได้ว่าเกณฑ์ตัด parent ไปกี่ตัว
+        """
+        # ดึง candidate เผื่อไว้ เพราะหลาย chunk อาจมาจาก parent เดียวกัน
+        params = params or HybridSearchParams.for_limit(limit)
+        vectors = vectors or await self.aembed_hybrid_query(query)
+
+        numpy_index = await self.aget_numpy_index(collection_name)
+        if numpy_index is not None:
+            # เหมือน query_points_groups(group_size=1): ไล่ chunk ตาม score เก็บ parent ละหนึ่ง hit ที่ดีที่สุด
+            # (ไม่ใช้ threshold ตอนค้น เพื่อนับได้ว่าเกณฑ์ตัด parent ไปกี่ตัว)
+            hits = await self.ahybrid_search(
+                collection_name, query, limit=numpy_index.size, params=replace(params, score_threshold=None), vectors=vectors
+            )
+            groups: "OrderedDict[str, float]" = OrderedDict()
+            for hit in hits:
+                if hit.parent_id is None or str(hit.parent_id) in groups:
+                    continue
+                groups[str(hit.parent_id)] = hit.score
+                if len(groups) >= limit:
+                    break
+            return apply_score_threshold(groups, params.score_threshold)
+
+        response = await self.async_client.query_points_groups(
+            collection_name=collection_name,
+            group_by="metadata.parent_id",
+            limit=limit,
+            group_size=1,
+            with_payload=False,
+            with_vectors=False,
+            **self.build_hybrid_query(vectors, params, await self.aget_dense_search_params(collection_name)),
+        )
+
+        groups = OrderedDict(
+            (str(group.id), group.hits[0].score)
+            for group in response.groups
+            if group.hits
+        )
+        return apply_score_threshold(groups, params.score_threshold)
+
+    async def asearch_collections(
+        self,
+        collection_names: List[str],
+        query: str,
+        limit: int = 10,
+        params: Optional[Dict[str, HybridSearchParams]] = None,
+        timeout: float = COLLECTION_SEARCH_TIMEOUT,
+        vectors: Optional[HybridVectors] = None,
+    ) -> Tuple[List[ParentHit], int]:
+        """
+        ค้นหลาย collection พร้อมกัน (asyncio.gather) แล้วรวมเป็น parent top-N ชุดเดียว
+        คืน (hits, pruned) โดย pruned = จำนวน parent ที่ score_threshold ของแต่ละ collection ตัดทิ้งรวมกัน
+        - embed คำถามครั้งเดียวใช้ทุก collection
+        - แต่ละ collection มี timeout ของตัวเอง ตัวที่ช้า/ล้มเหลวจะถูกข้าม ไม่ถ่วงตัวอื่น
+        - รวมด้วย RRF จากอันดับใน collection (1 / (COLLECTION_RRF_K + อันดับ)) หลังตัดด้วย score_threshold
+          เพราะ score ของแต่ละ collection เทียบกันตรง ๆ ไม่ได้ อันดับเท่ากันตัดสินด้วย score เดิม
+        """
+        collection_names = list(dict.fromkeys(collection_names))
+        params = params or {}
+        vectors = vectors or await self.aembed_hybrid_query(query)
+
+        async def search_one(collection_name: str):
+            return await asyncio.wait_for(
+                self.asearch_parent_groups(
+                    collection_name, query, limit=limit, params=params.get(collection_name), vectors=vectors
+                ),
+                timeout=timeout,
+            )
+
+        results = await asyncio.gather(*(search_one(name) for name in collection_names), return_exceptions=True)
+
+        hits: List[ParentHit] = []
+        pruned = 0
+        for collection_name, result in zip(collection_names, results):
+            if isinstance(result, BaseException):
+                reason = "timeout" if isinstance(result, asyncio.TimeoutError) else result
+                print(f"❗ ข้าม collection '{collection_name}': {reason}")
+                continue
+            pruned += result.pruned
+            hits.extend(
+                ParentHit(collection_name, parent_id, 1.0 / (COLLECTION_RRF_K + rank), score)
+                for rank, (parent_id, score) in enumerate(result.parents.items(), start=1)
+            )
+
+        hits.sort(key=lambda hit: (hit.score, hit.raw_score), reverse=True)
+        return hits[:limit], pruned
+
+    def get_index_version(self, collection_name: str) -> int:
+        """version ของ index ปัจจุบัน เพิ่มขึ้นทุกครั้งที่ collection ถูกสร้างใหม่"""
+        return self.index_versions.get(collection_name, 0)
+
+    def invalidate_collection(self, collection_name: str):
+        """
+        เรียกหลัง collection ถูกสร้าง/เขียนใหม่
+        เลื่อน index version, ลบ vector store ที่ cache ไว้ และล้าง parent cache ของ collection นั้น
+        """
+        self.index_versions[collection_name] = self.get_index_version(collection_name) + 1
+        self.vector_stores.pop(collection_name, None)
+        self.dense_search_params.pop(collection_name, None)
+        self.numpy_indexes.pop(collection_name, None)
+        removed = self.parent_cache.invalidate(collection_name)
+        print(f"🔄 invalidate '{collection_name}' → version {self.index_versions[collection_name]} (ลบ cache {removed} รายการ)")
     
 # Singleton instance
 db_manager = VectorDBManager()
@@ -98,6 +439,20 @@ def get_unique_parent_id_with_score(results: List[Tuple], limit: int = 10) -> Or
     return sorted_unique
     # return unique_docs
 
+def apply_score_threshold(groups: "OrderedDict[str, float]", threshold: Optional[float]) -> ParentGroups:
+    """
+    ตัด parent ที่ score ไม่เกิน threshold (score > threshold เหมือนตัวกรองเดิมใน search_endpoint)
+    ไม่ส่งเป็น score_threshold ของ Qdrant เพราะฝั่ง server เป็น score >= threshold และไม่บอกว่าตัดไปกี่ตัว
+    """
+    if threshold is None:
+        return ParentGroups(groups, 0)
+    parents = OrderedDict((parent_id, score) for parent_id, score in groups.items() if score > threshold)
+    return ParentGroups(parents, len(groups) - len(parents))
+
+def scored_chunk_from_point(point) -> ScoredChunk:
+    metadata = (point.payload or {}).get("metadata") or {}
+    return ScoredChunk(metadata.get("parent_id"), metadata.get("chunk_id"), point.score)
+
 def get_chunk_id(point):
     try:
         return point.payload["metadata"]["chunk_id"]
@@ -146,4 +501,117 @@ def search_chunk_by_parent_id(collection_name: str, parent_id: str, limit: int =
         return merged_text
     except Exception as e:
         print(f"เกิดข้อผิดพลาดในการ scroll: {e}")
-        return ([], None)
\ No newline at end of file
+        return ([], None)
+
+def group_chunk_by_parent_id(points) -> Dict[str, list]:
+    """
+    จัดกลุ่ม point ตาม metadata.parent_id แล้วเรียงแต่ละกลุ่มตาม chunk_id
+    """
+    grouped: Dict[str, list] = {}
+    for point in points:
+        try:
+            parent_id = point.payload["metadata"]["parent_id"]
+        except (KeyError, TypeError):
+            continue
+        grouped.setdefault(parent_id, []).append(point)
+
+    return {parent_id: sort_chunk_by_id(group) for parent_id, group in grouped.items()}
+
+def parent_ids_filter(parent_ids: List[str]) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="metadata.parent_id",
+                match=models.MatchAny(any=parent_ids),
+            ),
+        ]
+    )
+
+def chunks_from_points(points) -> Dict[str, Tuple[str, ...]]:
+    """จัดกลุ่ม point ตาม parent_id เรียงตาม chunk_id แล้วเหลือเฉพาะ page_content"""
+    grouped = group_chunk_by_parent_id(points)
+    return {
+        parent_id: tuple(point.payload["page_content"] for point in group if "page_content" in (point.payload or {}))
+        for parent_id, group in grouped.items()
+    }
+
+async def afetch_parent_chunks(
+    collection_name: str,
+    parent_ids: Iterable[str],
+    page_size: int = 256,
+) -> Dict[str, Tuple[str, ...]]:
+    """
+    ดึง chunk ของหลาย parent_id ในคำขอเดียว (MatchAny) โดยไม่ผ่าน cache (AsyncQdrantClient)
+
+    - scroll ต่อด้วย next_page_offset จนครบ ไม่ตัดที่จำนวน chunk ต่อ parent
+    - จัดกลุ่มและเรียงตาม chunk_id ฝั่ง client
+    Returns: {parent_id: (page_content, ...)} (parent ที่ไม่พบจะไม่อยู่ใน dict)
+    """
+    parent_ids = list(dict.fromkeys(parent_ids))  # ตัดตัวซ้ำ คงลำดับเดิม
+    if not parent_ids:
+        return {}
+
+    scroll_filter = parent_ids_filter(parent_ids)
+    points = []
+    offset = None
+    while True:
+        batch, offset = await db_manager.async_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        points.extend(batch)
+        if offset is None:
+            break
+
+    return chunks_from_points(points)
+
+def lookup_parent_cache(collection_name: str, parent_ids: List[str], version: int) -> Tuple[Dict[str, Tuple[str, ...]], List[str]]:
+    """แยก parent ที่อยู่ใน cache ออกจากที่ต้องดึงใหม่"""
+    found: Dict[str, Tuple[str, ...]] = {}
+    missing = []
+    for parent_id in parent_ids:
+        chunks = db_manager.parent_cache.get((collection_name, parent_id, version))
+        if chunks is None:
+            missing.append(parent_id)
+        else:
+            found[parent_id] = chunks
+    return found, missing
+
+def store_parent_cache(collection_name: str, fetched: Dict[str, Tuple[str, ...]], version: int):
+    for parent_id, chunks in fetched.items():
+        db_manager.parent_cache.put((collection_name, parent_id, version), chunks)
+
+def lookup_parent_store(collection_name: str, parent_ids: List[str], version: int) -> Tuple[Dict[str, Tuple[str, ...]], List[str]]:
+    """อ่าน parent จาก store ในเครื่อง (ใส่ cache ให้ด้วย) คืนตัวที่พบ และตัวที่ยังต้องดึงจาก Qdrant"""
+    found = db_manager.parent_store.get_chunks(collection_name, parent_ids)
+    store_parent_cache(collection_name, found, version)
+    return found, [parent_id for parent_id in parent_ids if parent_id not in found]
+
+async def aget_parent_chunks(
+    collection_name: str,
+    parent_ids: Iterable[str],
+    page_size: int = 256,
+) -> Dict[str, Tuple[str, ...]]:
+    """
+    เหมือน afetch_parent_chunks แต่ผ่าน parent cache และ parent store ในเครื่องก่อน
+    เฉพาะ parent ที่ไม่พบทั้งสองที่เท่านั้นที่ถูกดึงจาก Qdrant (รวมเป็นคำขอเดียว)
+    """
+    parent_ids = list(dict.fromkeys(parent_ids))
+    version = db_manager.get_index_version(collection_name)
+    found, missing = lookup_parent_cache(collection_name, parent_ids, version)
+
+    if missing:
+        # SQLite เป็น I/O แบบ blocking → ทำใน thread ไม่ให้บล็อก event loop
+        from_store, missing = await asyncio.to_thread(lookup_parent_store, collection_name, missing, version)
+        found.update(from_store)
+
+    if missing:
+        fetched = await afetch_parent_chunks(collection_name, missing, page_size=page_size)
+        store_parent_cache(collection_name, fetched, version)
+        found.update(fetched)
+
+    return {parent_id: found[parent_id] for parent_id in parent_ids if parent_id in found}
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class ParentRecord(NamedTuple):
+    parent_id: str
+    content: str                # ข้อความเต็มของ section (ก่อนแบ่ง chunk)
+    chunks: Tuple[str, ...]     # chunk ตามลำดับ chunk_id (รูปเดียวกับที่ได้จาก Qdrant)
+    metadata: dict              # header ของ section เช่น title/chapter/section/article
+
+
+class ParentDocumentStore:
+    """
+    ที่เก็บ parent document ในเครื่อง (SQLite) key = (collection, parent_id)
+    เขียนตอน ingest และอ่านตอนค้นหา → ได้ข้อความของ parent โดยไม่ต้อง scroll จาก Qdrant
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")  # ให้ process อื่น (เช่น script ingest) เขียนได้ระหว่างอ่าน
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS parents ("
+            "collection TEXT NOT NULL, parent_id TEXT NOT NULL, content TEXT NOT NULL, "
+            "chunks TEXT NOT NULL, metadata TEXT NOT NULL, source TEXT NOT NULL DEFAULT '', "
+            "PRIMARY KEY (collection, parent_id))"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(parents)")}
+        if "source" not in columns:
+            # ไฟล์ที่สร้างก่อนมี ingest แบบ incremental → parent เดิมถือว่าไม่มี source
+            self._db.execute("ALTER TABLE parents ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def replace_source(self, collection_name: str, source: str, records: Iterable[ParentRecord]) -> int:
+        """แทนที่ parent ทั้งหมดของเอกสารต้นทางหนึ่งไฟล์ใน transaction เดียว (parent ของไฟล์อื่นไม่ถูกแตะ)"""
+        rows = [
+            (
+                collection_name,
+                record.parent_id,
+                record.content,
+                json.dumps(list(record.chunks), ensure_ascii=False),
+                json.dumps(record.metadata, ensure_ascii=False),
+                source,
+            )
+            for record in records
+        ]
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM parents WHERE collection = ? AND source = ?", (collection_name, source))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO parents (collection, parent_id, content, chunks, metadata, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        print(f"📚 บันทึก parent document '{collection_name}' ({source}) {len(rows)} รายการ → {self.path}")
+        return len(rows)
+
+    def delete_source(self, collection_name: str, source: str) -> int:
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM parents WHERE collection = ? AND source = ?", (collection_name, source)
+            ).rowcount
+
+    def get_chunks(self, collection_name: str, parent_ids: List[str]) -> Dict[str, Tuple[str, ...]]:
+        """คืน {parent_id: chunks} เฉพาะ parent ที่มีใน store"""
+        if not parent_ids:
+            return {}
+        placeholders = ",".join("?" * len(parent_ids))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT parent_id, chunks FROM parents WHERE collection = ? AND parent_id IN ({placeholders})",
+                (collection_name, *parent_ids),
+            ).fetchall()
+            self.hits += len(rows)
+            self.misses += len(parent_ids) - len(rows)
+        return {parent_id: tuple(json.loads(chunks)) for parent_id, chunks in rows}
+
+    def delete_collection(self, collection_name: str) -> int:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM parents WHERE collection = ?", (collection_name,)).rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT collection, COUNT(*) FROM parents GROUP BY collection").fetchall())
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "collections": counts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class IngestedFileRegistry:
+    """
+    ทะเบียนไฟล์ที่ index แล้ว key = SHA-256 ของเนื้อไฟล์ (ใช้ข้ามไฟล์ซ้ำตอนอัปโหลด)
+    เก็บในไฟล์ SQLite เดียวกับ parent store
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingested_files ("
+            "sha256 TEXT PRIMARY KEY, collection TEXT NOT NULL, source TEXT NOT NULL, "
+            "record TEXT NOT NULL, indexed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, sha256: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT record FROM ingested_files WHERE sha256 = ?", (sha256,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, sha256: str, collection_name: str, source: str, record: dict):
+        """ลงทะเบียนไฟล์ (เนื้อหาเดิมของ source เดียวกันถูกแทนที่ใน index แล้ว จึงลบ hash เก่าของ source นั้นออก)"""
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM ingested_files WHERE collection = ? AND source = ?", (collection_name, source)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO ingested_files (sha256, collection, source, record, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (sha256, collection_name, source, json.dumps(record, ensure_ascii=False), time.time()),
+            )
+
+    def delete_collection(self, collection_name: str) -> int:
+        """collection ถูกสร้างใหม่/rollback → ไฟล์ที่เคย index ไว้อาจไม่อยู่แล้ว"""
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM ingested_files WHERE collection = ?", (collection_name,)).rowcount
@@ -0,0 +1,221 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_qdrant import SparseEmbeddings, SparseVector
+
+from app.documents.file_markdown import clean_line, thai_digit_to_arabic
+
+
+def normalize_query(text: str) -> str:
+    """
+    ทำให้คำถามอยู่ในรูปเดียวกันก่อนใช้เป็น key และก่อน embed
+    (NFKC, ยุบช่องว่าง, เลขไทย → อารบิก เหมือนตอน index เอกสาร)
+    """
+    return thai_digit_to_arabic(clean_line(text))
+
+
+class TTLLRUCache:
+    """
+    LRU cache ที่มีอายุ (TTL) ต่อ entry
+    ถ้ากำหนด persist_path จะเขียนลง SQLite และโหลดกลับตอนเริ่มต้น
+    การเขียนดิสก์ทำใน thread แยก (put ไม่รอ commit จึงไม่บล็อก event loop) และตารางบนดิสก์เก็บไม่เกิน max_entries ต่อ namespace
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        persist_path: Optional[str] = None,
+        namespace: str = "default",
+        encode: Callable[[Any], str] = json.dumps,
+        decode: Callable[[str], Any] = json.loads,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._encode = encode
+        self._decode = decode
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending: "queue.Queue[Tuple[str, Any, float]]" = queue.Queue()
+        if persist_path:
+            self._open(persist_path)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self._db is not None:
+            self._pending.put((key, value, expires_at))
+
+    def flush(self):
+        """รอจนรายการที่ค้างเขียนลงดิสก์ครบ"""
+        self._pending.join()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+    def _open(self, persist_path: str):
+        Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(persist_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        now = time.time()
+        self._db.execute("DELETE FROM embedding_cache WHERE expires_at < ?", (now,))
+        self._db.commit()
+
+        # โหลดรายการล่าสุดกลับเข้า memory (ตามลำดับวันหมดอายุ → ใกล้หมดอายุอยู่ฝั่ง LRU)
+        rows = self._db.execute(
+            "SELECT key, value, expires_at FROM embedding_cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT ?",
+            (self.namespace, self.max_entries),
+        ).fetchall()
+        for key, value, expires_at in reversed(rows):
+            self._entries[key] = (self._decode(value), expires_at)
+        print(f"📦 โหลด embedding cache '{self.namespace}' จากดิสก์ {len(rows)} รายการ")
+        threading.Thread(target=self._write_loop, name=f"embedding-cache-{self.namespace}", daemon=True).start()
+
+    def _write_loop(self):
+        """เขียนรายการที่ค้างทีละชุดใน transaction เดียว แล้วตัดรายการที่หมดอายุ/เกิน max_entries ออกจากดิสก์"""
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embedding_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                        [(self.namespace, key, self._encode(value), expires_at) for key, value, expires_at in batch],
+                    )
+                    self._db.execute(
+                        "DELETE FROM embedding_cache WHERE namespace = ? AND (expires_at < ? OR key NOT IN ("
+                        "SELECT key FROM embedding_cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT ?))",
+                        (self.namespace, time.time(), self.namespace, self.max_entries),
+                    )
+            except sqlite3.Error as e:
+                print(f"❗ เขียน embedding cache '{self.namespace}' ลงดิสก์ไม่สำเร็จ: {e}")
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+
+def encode_dense_vector(vector: np.ndarray) -> bytes:
+    return vector.astype(np.float32, copy=False).tobytes()
+
+
+def decode_dense_vector(value) -> np.ndarray:
+    # รายการที่เขียนไว้ก่อนเก็บเป็น float32 bytes เป็น JSON list
+    if isinstance(value, bytes):
+        return np.frombuffer(value, dtype=np.float32).copy()
+    return np.asarray(json.loads(value), dtype=np.float32)
+
+
+class CachedDenseEmbeddings(Embeddings):
+    """
+    ครอบ dense embeddings (bge-m3) ให้ cache ผลของ embed_query ตามข้อความที่ normalize แล้ว
+    cache เก็บเป็น float32 array (1024 มิติ ≈ 4 KB ต่อรายการ แทน list ของ float ≈ 32 KB) คืนเป็น list ตามเดิม
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: TTLLRUCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(key), dtype=np.float32)
+            self.cache.put(key, vector)
+        return vector.tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = np.asarray(await self.embeddings.aembed_query(key), dtype=np.float32)
+            self.cache.put(key, vector)
+        return vector.tolist()
+
+
+def encode_sparse_vector(vector: SparseVector) -> str:
+    return json.dumps({"indices": vector.indices, "values": vector.values})
+
+
+def decode_sparse_vector(value: str) -> SparseVector:
+    return SparseVector(**json.loads(value))
+
+
+class CachedSparseEmbeddings(SparseEmbeddings):
+    """ครอบ sparse embeddings (BM25) ให้ cache ผลของ embed_query ตามข้อความที่ normalize แล้ว"""
+
+    def __init__(self, embeddings: SparseEmbeddings, cache: TTLLRUCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[SparseVector]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> SparseVector:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(key)
+            self.cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> SparseVector:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(key)
+            self.cache.put(key, vector)
+        return vector
+
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Literal, Optional
+
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "1"))          # งาน ingest ที่ทำพร้อมกันได้
+INGEST_NICE = int(os.getenv("INGEST_NICE", "10"))                 # ลด priority ของ thread ingest (0 = ไม่ลด)
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))  # จำนวนงานที่จบแล้วที่เก็บสถานะไว้
+
+JobStatus = Literal["queued", "running", "completed", "failed", "cancelled"]
+
+
+class IngestCancelled(Exception):
+    """งานถูกยกเลิก (โยนออกจาก progress callback ที่จุดตรวจถัดไป)"""
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    filename: str
+    status: JobStatus = "queued"
+    stage: str = "queued"
+    progress: Dict[str, int] = field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def report(self, stage: Optional[str] = None, **counts: int):
+        """
+        progress callback ที่ส่งให้ขั้นตอน ingest (เช่น pages_parsed=3, chunks_embedded=64)
+        ทุกครั้งที่ถูกเรียกเป็นจุดตรวจการยกเลิกด้วย
+        """
+        if stage is not None:
+            self.stage = stage
+        self.progress.update(counts)
+        if self.cancel_event.is_set():
+            raise IngestCancelled(self.job_id)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def lower_thread_priority():
+    """ลด priority ของ worker thread (Linux ตั้ง nice ต่อ thread ได้ และ thread ลูกจะได้ค่าเดียวกัน)"""
+    if INGEST_NICE <= 0:
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), INGEST_NICE)
+    except (AttributeError, OSError) as e:
+        print(f"❗ ลด priority ของ ingest worker ไม่ได้: {e}")
+
+
+class IngestJobManager:
+    """
+    คิวงาน ingest เอกสาร ทำใน thread pool ขนาดจำกัดที่ priority ต่ำกว่า request แชท
+    endpoint ตอบกลับทันทีด้วย job_id แล้วดูสถานะ/ความคืบหน้า/ยกเลิกผ่าน job_id
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_manager()
+        return cls._instance
+
+    def _init_manager(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=INGEST_MAX_JOBS,
+            thread_name_prefix="ingest-job",
+            initializer=lower_thread_priority,
+        )
+        self.jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, work: Callable[[Callable[..., None]], dict]) -> IngestJob:
+        """work(progress) คืนผลลัพธ์ของงาน และเรียก progress(...) เป็นระยะ"""
+        job = IngestJob(job_id=uuid.uuid4().hex, filename=filename)
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._prune()
+        self.executor.submit(self._run, job, work)
+        print(f"📥 รับงาน ingest {job.job_id}: {filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[IngestJob]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """งานที่ยังรอคิวถูกยกเลิกทันที งานที่กำลังทำจะหยุดที่จุดตรวจถัดไป"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status in ("queued", "running"):
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+        return job
+
+    def _run(self, job: IngestJob, work: Callable[[Callable[..., None]], dict]):
+        if job.cancel_event.is_set():
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = work(job.report)
+            job.status = "completed"
+            job.stage = "done"
+        except IngestCancelled:
+            job.status = "cancelled"
+            print(f"🛑 ยกเลิกงาน ingest {job.job_id}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ งาน ingest {job.job_id} ล้มเหลว: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        # เรียกภายใต้ lock: เก็บงานที่จบแล้วไว้ไม่เกิน INGEST_JOB_HISTORY
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(len(finished) - INGEST_JOB_HISTORY, 0)]:
+            del self.jobs[job_id]
+
+
+# Singleton instance
+ingest_job_manager = IngestJobManager()
@@ -7,6 +7,10 @@ from langchain_ollama import OllamaLLM
 load_dotenv()
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
+# num_ctx ที่ส่งให้ Ollama (0 = ไม่ส่ง ใช้ค่า default ของ Ollama เหมือนเดิม) ยิ่งใหญ่ยิ่งใช้ KV memory และเวลา prefill มาก
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+# context window ที่ Ollama ใช้เมื่อไม่ได้ส่ง num_ctx ใช้คำนวณงบ token ของ prompt
+OLLAMA_DEFAULT_NUM_CTX = int(os.getenv("OLLAMA_DEFAULT_NUM_CTX", "2048"))
 
 class LocalLLMManager:
     _instance = None
@@ -56,7 +60,11 @@ class LocalLLMManager:
             return False
             
         try:
-            self._llm_instance = OllamaLLM(model=model_name, base_url=self.ollama_host)
+            self._llm_instance = OllamaLLM(
+                model=model_name,
+                base_url=self.ollama_host,
+                **({"num_ctx": OLLAMA_NUM_CTX} if OLLAMA_NUM_CTX > 0 else {}),
+            )
             self._current_model = model_name
             logging.info(f"Successfully switched to model: {model_name}")
             return True
@@ -76,5 +84,9 @@ class LocalLLMManager:
         """Get currently loaded model name"""
         return self._current_model or self.default_model
 
+    def get_context_window(self) -> int:
+        """Get context window (num_ctx) ที่ Ollama ใช้จริง: OLLAMA_NUM_CTX หรือค่า default ของ Ollama"""
+        return OLLAMA_NUM_CTX if OLLAMA_NUM_CTX > 0 else OLLAMA_DEFAULT_NUM_CTX
+
 # Singleton instance
 llm_manager = LocalLLMManager()
\ No newline at end of file
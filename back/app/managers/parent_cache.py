@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# key: (collection_name, parent_id, index_version)
+CacheKey = Tuple[str, str, int]
+
+
+def estimate_chunks_size(chunks: Tuple[str, ...]) -> int:
+    """ประมาณขนาดหน่วยความจำ (bytes) ของ chunk ทั้งหมดของ parent หนึ่งตัว"""
+    return sys.getsizeof(chunks) + sum(sys.getsizeof(chunk) for chunk in chunks)
+
+
+class ParentDocumentCache:
+    """
+    LRU cache ของ parent document ที่ประกอบจาก chunk แล้ว จำกัดด้วยขนาดหน่วยความจำรวม
+    key ผูกกับ index version ของ collection → เมื่อ collection ถูกสร้างใหม่ entry เก่าจะไม่ถูกใช้อีก
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[Tuple[str, ...], int]]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: CacheKey, chunks: Tuple[str, ...]):
+        size = estimate_chunks_size(chunks)
+        with self._lock:
+            if size > self.max_bytes:
+                return  # ใหญ่กว่าทั้ง cache ไม่ต้องเก็บ
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[1]
+            self._entries[key] = (chunks, size)
+            self._current_bytes += size
+            self._evict()
+
+    def invalidate(self, collection_name: str) -> int:
+        """ลบทุก entry ของ collection (ทุก version) คืนจำนวนที่ลบ"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == collection_name]
+            for key in stale:
+                self._current_bytes -= self._entries.pop(key)[1]
+            return len(stale)
+
+    def resize(self, max_bytes: int):
+        """เปลี่ยนขนาดสูงสุดของ cache แล้ว evict ส่วนเกินทันที"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        # เรียกภายใต้ lock เท่านั้น
+        while self._current_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._current_bytes -= size
+            self.evictions += 1
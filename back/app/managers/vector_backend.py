@@ -0,0 +1,128 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from qdrant_client.hybrid.fusion import distribution_based_score_fusion, reciprocal_rank_fusion
+
+# remote = Qdrant server (QDRANT_HOST), local = Qdrant local mode ในตัว process (QDRANT_PATH หรือ ":memory:")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "remote")
+QDRANT_PATH = os.getenv("QDRANT_PATH", ":memory:")
+# collection ที่มี point ไม่เกินค่านี้จะถูกโหลดมาค้นแบบ brute-force ด้วย NumPy ใน process (0 = ปิด)
+NUMPY_INDEX_MAX_POINTS = int(os.getenv("NUMPY_INDEX_MAX_POINTS", "0"))
+
+NUMPY_FUSIONS = {
+    "rrf": lambda responses, limit: reciprocal_rank_fusion(responses, limit=limit),
+    "dbsf": distribution_based_score_fusion,
+}
+
+
+class LocalAsyncClient:
+    """
+    ให้ QdrantClient โหมด local ใช้แทน AsyncQdrantClient ได้ (method เดียวกันแต่เป็น coroutine)
+    local mode เปิด storage เดียวกันจากสอง client ไม่ได้ จึงใช้ client ตัวเดียวร่วมกัน
+    งานทั้งหมดอยู่ใน process อยู่แล้ว (ไม่มี network) จึงเรียกตรงใน event loop
+    """
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+def create_clients(backend: str, url: str, path: str = QDRANT_PATH) -> Tuple[QdrantClient, object]:
+    """สร้าง (sync client, async client) ตาม backend"""
+    if backend == "remote":
+        return QdrantClient(url=url), AsyncQdrantClient(url=url)
+    if backend == "local":
+        client = QdrantClient(location=":memory:") if path == ":memory:" else QdrantClient(path=path)
+        print(f"🗄️ ใช้ Qdrant local mode: {path}")
+        return client, LocalAsyncClient(client)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend} (remote | local)")
+
+
+class NumpyHybridIndex:
+    """
+    index ใน memory ของ collection ขนาดเล็ก: dense (cosine) + sparse (dot product) แบบ brute-force
+    fusion ด้วยฟังก์ชันเดียวกับ Qdrant local mode ผลจึงเทียบกับ Query API ได้
+    """
+
+    def __init__(self, points: List[models.Record]):
+        self.size = len(points)
+        self.ids = [point.id for point in points]
+        self.refs = [
+            {
+                "parent_id": (point.payload or {}).get("metadata", {}).get("parent_id"),
+                "chunk_id": (point.payload or {}).get("metadata", {}).get("chunk_id"),
+            }
+            for point in points
+        ]
+
+        dense = np.asarray([point.vector["dense"] for point in points], dtype=np.float32)
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        self.dense = dense / np.where(norms == 0, 1.0, norms)
+
+        # inverted index ของ sparse: term → (แถว, น้ำหนัก)
+        postings: Dict[int, Tuple[List[int], List[float]]] = {}
+        for row, point in enumerate(points):
+            sparse = point.vector.get("sparse")
+            if sparse is None:
+                continue
+            for index, value in zip(sparse.indices, sparse.values):
+                rows, values = postings.setdefault(index, ([], []))
+                rows.append(row)
+                values.append(value)
+        self.sparse = {
+            index: (np.asarray(rows, dtype=np.int64), np.asarray(values, dtype=np.float32))
+            for index, (rows, values) in postings.items()
+        }
+
+    def dense_scores(self, vector: List[float]) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        return self.dense @ query
+
+    def sparse_scores(self, vector: models.SparseVector) -> Tuple[np.ndarray, np.ndarray]:
+        """คืน (score, mask ของแถวที่มี term ร่วมกับคำถาม)"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = np.zeros(self.size, dtype=bool)
+        for index, value in zip(vector.indices, vector.values):
+            posting = self.sparse.get(index)
+            if posting is None:
+                continue
+            rows, values = posting
+            np.add.at(scores, rows, values * value)
+            matched[rows] = True
+        return scores, matched
+
+    def _top(self, scores: np.ndarray, limit: int, mask: Optional[np.ndarray] = None) -> List[models.ScoredPoint]:
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(self.size)
+        if limit < len(candidates):
+            top = np.argpartition(-scores[candidates], limit)[:limit]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            models.ScoredPoint(id=self.ids[row], version=0, score=float(scores[row]), payload={"metadata": self.refs[row]})
+            for row in order
+        ]
+
+    def search(self, vectors, params, limit: int) -> List[models.ScoredPoint]:
+        """prefetch dense/sparse ตาม limit ของแต่ละฝั่ง → fusion → limit (score_threshold ใช้ทีหลังกับกลุ่ม parent)"""
+        if params.fusion not in NUMPY_FUSIONS:
+            raise ValueError(f"Unknown fusion: {params.fusion}")
+        dense_vector, sparse_vector = vectors
+        sparse_scores, matched = self.sparse_scores(sparse_vector)
+        responses = [
+            self._top(self.dense_scores(dense_vector), params.dense_limit),
+            self._top(sparse_scores, params.sparse_limit, matched),
+        ]
+        fused = NUMPY_FUSIONS[params.fusion](responses, max(params.dense_limit + params.sparse_limit, limit))
+        return fused[:limit]
@@ -1,7 +1,20 @@
+# ตัวอย่างคำถามพร้อมหมวด ใช้ทั้งใน few-shot prompt และเป็นข้อมูลตั้งต้นของ classifier แบบ embedding
+CLASSIFICATION_EXAMPLES = [
+    ("สวัสดีครับ", "ทั่วไป"),
+    ("จัดซื้อจัดจ้าง", "กฎหมาย"),
+    ("พระราชบัญญัติ", "กฎหมาย"),
+    ("ลาพักผ่อนได้กี่วัน", "สวัสดิการ"),
+    ("ขอแบบฟอร์มวันลา", "สวัสดิการ"),
+]
+
+def format_examples(examples: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"คำถาม: {question}  \nหมวด: {label}" for question, label in examples)
+
 def build_classification_prompt(question: str) -> str:
     """
     คืนค่า prompt สำหรับการจำแนกหมวดหมู่คำถาม
     """
+    examples = format_examples(CLASSIFICATION_EXAMPLES)
     return f"""คุณคือตัวช่วยคัดกรองคำถามก่อนค้นเอกสาร (RAG)
 
 จำแนกคำถามต่อไปนี้ว่าอยู่ในหมวดใด:
@@ -12,20 +25,7 @@ def build_classification_prompt(question: str) -> str:
 - "แบบฟอร์ม" = คำถามที่ต้องการขอแบบฟอร์ม เช่น แบบฟอร์มวันลา, แบบฟอร์มการเบิก, แบบฟอร์มค่ารักษา ฯลฯ
 
 ตัวอย่าง:
-คำถาม: สวัสดีครับ  
-หมวด: ทั่วไป
-
-คำถาม: จัดซื้อจัดจ้าง  
-หมวด: กฎหมาย
-
-คำถาม: พระราชบัญญัติ  
-หมวด: กฎหมาย
-
-คำถาม: ลาพักผ่อนได้กี่วัน  
-หมวด: สวัสดิการ
-
-คำถาม: ขอแบบฟอร์มวันลา  
-หมวด: สวัสดิการ
+{examples}
 
 ตอบกลับมาเป็นแค่: ทั่วไป หรือ กฎหมาย หรือ สวัสดิการ:
 
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+from app.managers.embedding_cache import TTLLRUCache
+
+MIN_UNIT_CHARS = int(os.getenv("COMPRESS_MIN_UNIT_CHARS", "40"))
+# entry ละ 1 vector float32 (bge-m3 1024 มิติ ≈ 4 KB) → ค่าเริ่มต้น ≈ 16 MB ต่อ process
+UNIT_EMBEDDING_CACHE_SIZE = int(os.getenv("UNIT_EMBEDDING_CACHE_SIZE", "4096"))
+UNIT_EMBEDDING_CACHE_TTL = float(os.getenv("UNIT_EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+
+# ภาษาไทยใช้ช่องว่างคั่นประโยค/วลี → ตัดเฉพาะช่องว่างที่อยู่ระหว่างอักษรไทยสองตัว
+# (ไม่ตัด "มาตรา 5" หรือ "(1) ..." ที่มีตัวเลข/วงเล็บอยู่ข้างช่องว่าง)
+THAI_SENTENCE_BREAK = re.compile(r"(?<=[ก-๛])\s+(?=[ก-๛])")
+
+# embedding ของหน่วยข้อความ (ประโยค/ย่อหน้า) ซ้ำกันข้ามคำถามบ่อย เพราะมาจากมาตราเดิมๆ
+unit_embedding_cache = TTLLRUCache(UNIT_EMBEDDING_CACHE_SIZE, UNIT_EMBEDDING_CACHE_TTL, namespace="units")
+unit_vector_bytes = 0  # ขนาดของ vector หนึ่งตัวใน cache (ใช้รายงานขนาด cache)
+
+
+def split_units(text: str) -> List[str]:
+    """แบ่งข้อความเป็นหน่วย (ย่อหน้า → ประโยคไทย) รวมชิ้นที่สั้นกว่า MIN_UNIT_CHARS เข้ากับชิ้นก่อนหน้า"""
+    units: List[str] = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        merged: List[str] = []
+        for sentence in THAI_SENTENCE_BREAK.split(paragraph):
+            if merged and len(merged[-1]) < MIN_UNIT_CHARS:
+                merged[-1] = f"{merged[-1]} {sentence}"
+            else:
+                merged.append(sentence)
+        units.extend(merged)
+    return units
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+async def embed_units(embeddings, units: Sequence[str]) -> np.ndarray:
+    """
+    embed หน่วยข้อความทั้งหมดในคำขอเดียว (เฉพาะตัวที่ยังไม่อยู่ใน cache) แล้ว normalize
+    cache เก็บ vector ที่ normalize แล้วเป็น np.float32 (list ของ float ใช้ memory มากกว่า ~8 เท่า)
+    """
+    global unit_vector_bytes
+    keys = [hashlib.sha1(unit.encode("utf-8")).hexdigest() for unit in units]
+    vectors = [unit_embedding_cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+    if missing:
+        fetched = normalize_rows(np.asarray(
+            await embeddings.aembed_documents([units[i] for i in missing]), dtype=np.float32
+        ))
+        for i, vector in zip(missing, fetched):
+            vectors[i] = vector.copy()  # copy: ไม่ให้แถวที่อยู่ใน cache ยึด array ทั้ง batch ไว้
+            unit_embedding_cache.put(keys[i], vectors[i])
+        unit_vector_bytes = fetched[0].nbytes
+
+    return np.stack(vectors)
+
+
+def unit_embedding_cache_stats() -> dict:
+    """stats ของ cache พร้อมขนาดโดยประมาณ (ทุก entry เป็น vector ขนาดเดียวกัน)"""
+    stats = unit_embedding_cache.stats()
+    stats["approx_bytes"] = stats["entries"] * unit_vector_bytes
+    return stats
+
+
+def select_units(units: List[str], scores: np.ndarray, ratio: float) -> List[str]:
+    """
+    เลือกหน่วยที่ score สูงสุดจนได้ความยาว ≥ ratio ของทั้งหมด แล้วเรียงกลับตามลำดับเดิม
+    เก็บหน่วยแรกไว้เสมอ (มักเป็นหัวเรื่อง/เลขมาตรา ที่ต้องใช้อ้างอิง)
+    """
+    target = ratio * sum(len(unit) for unit in units)
+    keep = {0}
+    kept_chars = len(units[0])
+    for index in np.argsort(-scores):
+        if kept_chars >= target:
+            break
+        if index in keep:
+            continue
+        keep.add(int(index))
+        kept_chars += len(units[index])
+    return [unit for i, unit in enumerate(units) if i in keep]
+
+
+async def compress_contexts(contexts: List[dict], query_vector, embeddings, ratio: float) -> List[dict]:
+    """
+    ตัดประโยค/ย่อหน้าที่ไม่เกี่ยวกับคำถามออกจากแต่ละ parent ก่อนส่งให้ LLM
+    - แบ่งหน่วยแบบรู้จักภาษาไทย, embed ทุกหน่วยของทุก parent ในครั้งเดียว, ให้ score ด้วย matrix product
+    - คืน context ใหม่ที่ "chunks" เป็นหน่วยที่เก็บไว้ (ลำดับเดิม) และ "compressed" = True
+    """
+    if ratio >= 1:
+        return contexts
+
+    per_parent = [split_units(item.get("content", "")) for item in contexts]
+    all_units = [unit for units in per_parent for unit in units]
+    if not all_units:
+        return contexts
+
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+    scores = await embed_units(embeddings, all_units) @ query
+
+    compressed = []
+    offset = 0
+    for item, units in zip(contexts, per_parent):
+        parent_scores = scores[offset:offset + len(units)]
+        offset += len(units)
+        kept = select_units(units, parent_scores, ratio) if units else []
+        compressed.append({**item, "chunks": tuple(kept), "content": "\n".join(kept), "compressed": True})
+
+    before = sum(len(item.get("content", "")) for item in contexts)
+    after = sum(len(item["content"]) for item in compressed)
+    print(f"✂️ บีบอัดบริบท {before} → {after} ตัวอักษร ({len(all_units)} หน่วย)")
+    return compressed
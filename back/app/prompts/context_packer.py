@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+from app.managers.db_manager import db_manager
+
+# อัตราส่วนตัวอักษรต่อ token โดยประมาณ (tokenizer ของ llama/qwen ตัดภาษาไทยถี่กว่าภาษาอังกฤษมาก)
+THAI_CHARS_PER_TOKEN = float(os.getenv("THAI_CHARS_PER_TOKEN", "1.8"))
+OTHER_CHARS_PER_TOKEN = float(os.getenv("OTHER_CHARS_PER_TOKEN", "3.5"))
+ANSWER_TOKEN_RESERVE = int(os.getenv("ANSWER_TOKEN_RESERVE", "1024"))  # เผื่อไว้ให้คำตอบของ LLM
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))  # จำนวน parent
+
+THAI_CHAR_PATTERN = re.compile(r"[฀-๿]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """ประมาณจำนวน token ของข้อความผสมไทย/อังกฤษ (ปัดขึ้น ให้พลาดไปทางปลอดภัย)"""
+    if not text:
+        return 0
+    thai = len(THAI_CHAR_PATTERN.findall(text))
+    spaces = len(WHITESPACE_PATTERN.findall(text))
+    other = len(text) - thai - spaces
+    return int(thai / THAI_CHARS_PER_TOKEN + other / OTHER_CHARS_PER_TOKEN + spaces) + 1
+
+
+class TokenCountCache:
+    """LRU ของจำนวน token ต่อ chunk ของแต่ละ parent key = (collection, parent_id, index_version)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[int, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def counts(self, key: Tuple[str, str, int], chunks: Sequence[str]) -> Tuple[int, ...]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and len(cached) == len(chunks):
+                self._entries.move_to_end(key)
+                return cached
+
+        counts = tuple(estimate_tokens(chunk) for chunk in chunks)
+        with self._lock:
+            self._entries[key] = counts
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return counts
+
+
+token_count_cache = TokenCountCache(TOKEN_COUNT_CACHE_SIZE)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    budget: int
+    parents: int        # จำนวน parent ที่ถูกใส่ (รวมตัวที่ถูกตัดท้าย)
+    truncated: bool     # parent ตัวสุดท้ายถูกตัดที่ขอบ chunk หรือไม่
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """ส่วนต้นที่ยาวที่สุดของ text ที่ estimate_tokens ไม่เกิน max_tokens (binary search ตามจำนวนตัวอักษร)"""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def context_budget(context_window: int, prompt_without_context: str) -> int:
+    """งบ token ของบริบท = context window - (template + ประวัติ + คำถาม) - ส่วนเผื่อคำตอบ"""
+    return max(context_window - estimate_tokens(prompt_without_context) - ANSWER_TOKEN_RESERVE, 0)
+
+
+def pack_contexts(contexts: List[dict], budget: int, collection_name: str, index_version: int) -> PackedContext:
+    """
+    ใส่ parent ตามลำดับ score จนเต็มงบ token
+    parent ตัวแรกที่ใส่ไม่พอดีจะถูกตัดที่ขอบ chunk (เก็บ chunk ต้นๆ ที่ยังพอ) แล้วหยุด
+    ถ้าแม้แต่ chunk แรกของ parent ก็ไม่พอดี จะข้ามไปลอง parent ถัดไปแทน
+    (ไม่มีอะไรพอดีเลย → ตัด chunk แรกของ parent อันดับแรกให้พอดีงบ จะได้ไม่ส่งบริบทว่าง)
+    contexts: [{"parent_id", "score", "chunks", ...}] เรียงจาก score มากไปน้อยแล้ว
+    (context ที่มี "collection_name" ของตัวเอง เช่นจากการค้นหลาย collection จะใช้ key ของ collection นั้น)
+    """
+    separator_tokens = 1  # "\n" ระหว่าง chunk / parent
+    parts: List[str] = []
+    used = 0
+    parents = 0
+    truncated = False
+
+    for item in contexts:
+        chunks = item.get("chunks") or ()
+        if not chunks:
+            continue
+        if item.get("compressed"):
+            # ผลบีบอัดขึ้นกับคำถาม จึงไม่ใช้ cache ที่ผูกกับ parent
+            counts = tuple(estimate_tokens(chunk) for chunk in chunks)
+        else:
+            item_collection = item.get("collection_name", collection_name)
+            item_version = index_version if item_collection == collection_name else db_manager.get_index_version(item_collection)
+            counts = token_count_cache.counts((item_collection, item["parent_id"], item_version), chunks)
+        parent_tokens = sum(counts) + separator_tokens * len(counts)
+
+        if used + parent_tokens <= budget:
+            parts.extend(chunks)
+            used += parent_tokens
+            parents += 1
+            continue
+
+        # ตัดท้ายที่ขอบ chunk
+        for chunk, count in zip(chunks, counts):
+            if used + count + separator_tokens > budget:
+                break
+            parts.append(chunk)
+            used += count + separator_tokens
+            truncated = True
+        if truncated:
+            parents += 1
+            break
+        # chunk แรกของ parent นี้ใหญ่เกินงบที่เหลือ → ลอง parent ถัดไปที่อาจเล็กกว่า
+
+    if not parts:
+        # ไม่มี chunk ไหนพอดีงบเลย → ตัด chunk แรกของ parent ที่ score สูงสุดให้พอดี ดีกว่าส่งบริบทว่าง
+        first = next((item["chunks"][0] for item in contexts if item.get("chunks")), None)
+        if first is not None and budget > separator_tokens:
+            text = trim_to_tokens(first, budget - separator_tokens)
+            if text:
+                parts.append(text)
+                used = estimate_tokens(text) + separator_tokens
+                parents = 1
+                truncated = True
+
+    return PackedContext(text="\n".join(parts), tokens=used, budget=budget, parents=parents, truncated=truncated)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from pydantic import BaseModel
+from app.managers.db_manager import db_manager
+from app.managers.answer_cache import answer_cache
+from app.prompts.context_compressor import unit_embedding_cache_stats
+
+router = APIRouter()
+
+class CacheSizeRequest(BaseModel):
+    max_bytes: int
+
+@router.get("/cache/stats")
+def cache_stats():
+    return {
+        "parent_cache": db_manager.parent_cache.stats(),
+        "parent_store": db_manager.parent_store.stats(),
+        "index_versions": db_manager.index_versions,
+        "dense_embedding_cache": db_manager.dense_embeddings.cache.stats(),
+        "sparse_embedding_cache": db_manager.sparse_embeddings.cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "unit_embedding_cache": unit_embedding_cache_stats(),
+    }
+
+@router.put("/cache/parent/max-bytes")
+def set_parent_cache_size(req: CacheSizeRequest):
+    db_manager.parent_cache.resize(req.max_bytes)
+    return db_manager.parent_cache.stats()
@@ -1,17 +1,21 @@
 import asyncio
 import uuid
+from dataclasses import astuple
 from fastapi import APIRouter
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Literal, Optional
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from app.managers.local_llm_manager import llm_manager
 from fastapi import APIRouter, HTTPException
-from app.managers.db_manager import db_manager, get_unique_parent_id_with_score, search_chunk_by_parent_id
+from app.managers.db_manager import FusionType, HybridSearchParams, HybridVectors, db_manager, aget_parent_chunks
 from app.managers.memory_manager import MEMORY_WINDOW
+from app.managers.answer_cache import answer_cache
 from app.managers import memory_manager  # ใช้ global instance เดียวกัน
-from app.prompts.classifier_prompts import build_classification_prompt
+from app.managers.classifier_manager import is_general_question, question_classifier
 from app.prompts.expert_prompts import INSTRUCTIONS, FALLBACK_INSTRUCTION, base_prompt
+from app.prompts.context_packer import context_budget, pack_contexts
+from app.prompts.context_compressor import compress_contexts
 
 router = APIRouter()
 
@@ -19,6 +23,20 @@ router = APIRouter()
 # Config
 # ------------------------------
 SUMMARY_TRIGGER_LEN = 12  # จำนวน message ก่อนสรุป
+CACHED_ANSWER_STREAM_CHARS = 64  # ขนาดชิ้นตอน replay คำตอบจาก answer cache
+
+# หมวดคำถาม → collection ที่ใช้ค้น (หมวดที่ไม่อยู่ในนี้ใช้ "unknown")
+CATEGORY_COLLECTIONS = {
+    "กฎหมาย": "thai_law_hybrid",
+    "สวัสดิการ": "welfare",
+}
+
+# เกณฑ์ relevance ขั้นต่ำ (score > threshold) ใช้กับกลุ่ม parent ก่อนดึง chunk → parent ที่ไม่ผ่านจะไม่ถูก hydrate
+DEFAULT_SCORE_THRESHOLD = 0.2
+COLLECTION_SCORE_THRESHOLDS = {
+    "thai_law_hybrid": 0.2,
+    "welfare": 0.2,
+}
 # MEMORY_WINDOW = 12  # จำนวน message ที่คงไว้ใน memory
 
 # ------------------------------
@@ -46,6 +64,16 @@ class SearchRequest(BaseModel):
     model: str | None = "llama3.2"
     user_id: str | None = None
     chat_session_id: str | None = None
+    fusion: FusionType = "rrf"
+    dense_prefetch: int | None = None   # None = l_search * PARENT_GROUP_PREFETCH_FACTOR
+    sparse_prefetch: int | None = None
+    speculative: bool = False  # ค้นทุก collection ไปพร้อมกับการ classify แล้วเก็บเฉพาะผลของหมวดที่ได้
+    score_thresholds: dict[str, float] | None = None  # {collection_name: threshold} ทับค่า COLLECTION_SCORE_THRESHOLDS
+    collections: list[str] | None = None  # ค้นหลาย collection พร้อมกันแทน collection ตามหมวด
+    collection_timeout: float | None = None  # วินาที ต่อ collection (None = COLLECTION_SEARCH_TIMEOUT)
+    compress_ratio: float | None = Field(default=None, gt=0, le=1)  # เก็บเนื้อหาที่เกี่ยวข้องไว้ราวสัดส่วนนี้ (None = ไม่บีบอัด)
+    use_answer_cache: bool = True
+    answer_cache_threshold: float | None = None  # None = ใช้ค่า ANSWER_CACHE_THRESHOLD
 
 # ------------------------------
 # Memory functions
@@ -133,31 +161,15 @@ def set_prompt_expert(expert: str, context: str, history: str, question: str) ->
     return base_prompt(expert_name, instruction, context, history, question)
 
 # ------------------------------
-# Dummy classify function
+# Classify function
 # ------------------------------
-GREETING_KEYWORDS = ["สวัสดี", "ขอบคุณ", "บาย", "ทดสอบ", "hello", "hi", "คุณชื่ออะไร"]
-
-def is_general_question(prompt: str) -> bool:
-    return any(word in prompt.lower() for word in GREETING_KEYWORDS)
-
-async def classify_question_type(prompt: str) -> Literal["ทั่วไป", "กฎหมาย", "สวัสดิการ", "แบบฟอร์ม"]:
-    
-    if (is_general_question(prompt)):
-        return "ทั่วไป"
-    
-    few_shot_prompt = build_classification_prompt(prompt)
-
-    result = ""
-    async for chunk in llm_manager.llm.astream(few_shot_prompt):
-        result += chunk
-
-    if "ทั่วไป" in result:
-        return "ทั่วไป"
-    elif "สวัสดิการ" in result:
-        return "สวัสดิการ"
-    else:
-        return "กฎหมาย"
-        # return "สวัสดิการ"
+async def classify_question_type(
+    prompt: str,
+    query_vectors: Optional[asyncio.Task] = None,
+) -> Literal["ทั่วไป", "กฎหมาย", "สวัสดิการ", "แบบฟอร์ม"]:
+    # keyword → embedding centroid → LLM (เฉพาะเมื่อไม่มั่นใจ)
+    # query_vectors = embedding ของ speculative retrieval (ถ้ามี) ใช้ร่วมกัน ไม่ต้องยิง Ollama ซ้ำ
+    return await question_classifier.classify(prompt, query_vectors)
 
 
 # ------------------------------
@@ -183,26 +195,90 @@ async def summarize_history(history: list) -> str:
 # ------------------------------
 # Perform Search function
 # ------------------------------
-async def perform_search(prompt: str, collection_name: str, l_search: int, l_chunk: int):
+async def perform_search(
+    prompt: str,
+    collection_name: str,
+    l_search: int,
+    l_chunk: int,
+    params: Optional[HybridSearchParams] = None,
+    vectors: Optional[HybridVectors] = None,
+):
+    """
+    Returns: (contexts, pruned)
+    pruned = จำนวน parent ที่ค้นเจอแต่ถูกตัดทิ้งเพราะ score ไม่เกิน score_threshold ของ params
+    """
     try:
-        vectorstore = db_manager.get_vectorstore(collection_name)
+        # Step 1: ให้ Qdrant จัดกลุ่มตาม parent_id ฝั่ง server → ได้ parent ไม่ซ้ำกัน (l_search) ตัวในคำขอเดียว
+        # score_threshold ตัดกลุ่มที่ได้ก่อน hydrate → parent ที่ไม่ผ่านเกณฑ์ไม่ถูกดึง chunk
+        unique_parents, pruned = await db_manager.asearch_parent_groups(
+            collection_name, prompt, limit=l_search, params=params, vectors=vectors
+        )
 
-        # Step 1: ดึง top 15 เพราะอาจมี doc ที่ซ้ำ ดึงเยอะมาก่อน
-        result_with_score = vectorstore.similarity_search_with_score(prompt, k=l_search)
-        # Step 2: คัด doc จำนวน (l_search) ต้องไม่ซ้ำกัน กรองด้วย parent_id
-        unique_docs = get_unique_parent_id_with_score(result_with_score, limit=l_search)
+        # Step 2: ดึง chunk ของทุก parent ในคำขอเดียว (l_chunk ใช้กำหนดขนาดหน้า scroll)
+        parent_chunks = await aget_parent_chunks(
+            collection_name=collection_name,
+            parent_ids=unique_parents.keys(),
+            page_size=max(l_chunk * len(unique_parents), 1),
+        )
 
         contexts = []
-        for parent_id, chunk in unique_docs.items():
-            full_content = search_chunk_by_parent_id(collection_name=collection_name, parent_id=parent_id, limit=l_chunk)
-            score = chunk[0][1]
+        for parent_id, score in unique_parents.items():
+            chunks = parent_chunks.get(parent_id, ())
             contexts.append({
                 "parent_id": parent_id,
                 "score": score,
-                "content": full_content
+                "chunks": chunks,
+                "content": "\n".join(chunks)
+            })
+
+        return contexts, pruned
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"การค้นหาล้มเหลว: {str(e)}"
+        )
+
+async def perform_multi_search(
+    prompt: str,
+    collection_names: list[str],
+    l_search: int,
+    l_chunk: int,
+    params: dict[str, HybridSearchParams],
+    timeout: Optional[float] = None,
+):
+    """
+    เหมือน perform_search แต่ค้นหลาย collection พร้อมกันแล้วรวมผลเป็น top (l_search) parent
+    Returns: (contexts, pruned) โดย context แต่ละตัวมี "collection_name" ของตัวเอง
+    """
+    try:
+        hits, pruned = await db_manager.asearch_collections(
+            collection_names, prompt, limit=l_search, params=params,
+            **({"timeout": timeout} if timeout is not None else {}),
+        )
+
+        # hydrate แยกตาม collection พร้อมกัน
+        by_collection: dict[str, list[str]] = {}
+        for hit in hits:
+            by_collection.setdefault(hit.collection_name, []).append(hit.parent_id)
+        hydrated = await asyncio.gather(*(
+            aget_parent_chunks(name, parent_ids, page_size=max(l_chunk * len(parent_ids), 1))
+            for name, parent_ids in by_collection.items()
+        ))
+        parent_chunks = dict(zip(by_collection.keys(), hydrated))
+
+        contexts = []
+        for hit in hits:
+            chunks = parent_chunks[hit.collection_name].get(hit.parent_id, ())
+            contexts.append({
+                "collection_name": hit.collection_name,
+                "parent_id": hit.parent_id,
+                "score": hit.score,
+                "chunks": chunks,
+                "content": "\n".join(chunks)
             })
 
-        return contexts
+        return contexts, pruned
 
     except Exception as e:
         raise HTTPException(
@@ -210,6 +286,41 @@ async def perform_search(prompt: str, collection_name: str, l_search: int, l_chu
             detail=f"การค้นหาล้มเหลว: {str(e)}"
         )
 
+def search_params_for(request: SearchRequest, collection_name: str) -> HybridSearchParams:
+    """HybridSearchParams ของ request พร้อม score_threshold ตาม collection"""
+    thresholds = {**COLLECTION_SCORE_THRESHOLDS, **(request.score_thresholds or {})}
+    return HybridSearchParams.for_limit(
+        request.l_search,
+        fusion=request.fusion,
+        dense_limit=request.dense_prefetch,
+        sparse_limit=request.sparse_prefetch,
+        score_threshold=thresholds.get(collection_name, DEFAULT_SCORE_THRESHOLD),
+    )
+
+def answer_cache_settings(request: SearchRequest, collection_name: str) -> tuple:
+    """ค่าที่มีผลต่อคำตอบ: model + ค่าการค้น/บีบอัดบริบท (คำตอบจากค่าต่างกันใช้แทนกันไม่ได้)"""
+    return (
+        request.model,
+        request.l_search,
+        request.l_chunk,
+        request.compress_ratio,
+        astuple(search_params_for(request, collection_name)),
+    )
+
+async def speculative_search(vectors_task: asyncio.Task, prompt: str, collection_name: str, l_search: int, l_chunk: int, params: HybridSearchParams):
+    """
+    รอ embedding ที่คำนวณครั้งเดียว แล้วค้นใน collection ที่กำหนด
+    shield: task นี้ถูกยกเลิกได้ (หมวดไม่ตรง) แต่ต้องไม่ยกเลิก vectors_task ที่ task อื่นและ answer cache รออยู่
+    """
+    vectors = await asyncio.shield(vectors_task)
+    return await perform_search(prompt, collection_name, l_search, l_chunk, params=params, vectors=vectors)
+
+def discard_tasks(tasks):
+    """ยกเลิก task ที่ไม่ใช้แล้ว และเก็บ exception ทิ้งเพื่อไม่ให้มี warning"""
+    for task in tasks:
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
 # ------------------------------
 # Match Form function
 # ------------------------------    
@@ -230,6 +341,10 @@ def markdown_link_from_url(url: str, label: str = "คลิกที่นี
     return f"[{label}]({url})"
 
 
+@router.get("/llm/search-rag/classifier/stats")
+def classifier_stats():
+    return question_classifier.stats()
+
 # ------------------------------
 # Main endpoint
 # ------------------------------
@@ -242,11 +357,32 @@ async def search_endpoint(request: SearchRequest):
     chat_session_id = request.chat_session_id or str(uuid.uuid4())  # กำหนด chat_session_id ถ้าไม่ได้ส่งมา
     user_question = request.prompt
 
+    # ------- Speculative retrieval: embed ครั้งเดียวแล้วค้นทุก collection ระหว่างรอ classify ------
+    query_vectors_task = None
+    speculative_tasks: dict[str, asyncio.Task] = {}
+    if request.speculative and not is_general_question(user_question):
+        query_vectors_task = asyncio.create_task(db_manager.aembed_hybrid_query(user_question))
+        speculative_tasks = {
+            collection: asyncio.create_task(speculative_search(
+                query_vectors_task, user_question, collection, request.l_search, request.l_chunk,
+                search_params_for(request, collection),
+            ))
+            for collection in CATEGORY_COLLECTIONS.values()
+        }
+
     # ------- Classify คำถามก่อน ------
-    category = await classify_question_type(user_question)
+    try:
+        category = await classify_question_type(user_question, query_vectors_task)
+    except BaseException:
+        discard_tasks(speculative_tasks.values())
+        raise
 
     print("หมวด : ", category)
 
+    # เก็บเฉพาะผลค้นของหมวดที่ได้ ที่เหลือยกเลิก (หมวด "ทั่วไป" ยกเลิกทั้งหมด)
+    search_task = speculative_tasks.pop(CATEGORY_COLLECTIONS.get(category), None)
+    discard_tasks(speculative_tasks.values())
+
     # แยก memory
     if category == "ทั่วไป":
         mode = "general"
@@ -351,32 +487,92 @@ async def search_endpoint(request: SearchRequest):
 
     # ------- คำถามเชิงเอกสาร (ใช้ RAG) -------
 
-    if (category == "กฎหมาย") :
-        collection_name = "thai_law_hybrid"
-    elif (category == "สวัสดิการ"):
-        collection_name = "welfare"
+    collection_name = CATEGORY_COLLECTIONS.get(category, "unknown")
+    multi_collections = request.collections or []
+    if multi_collections and search_task is not None:
+        discard_tasks([search_task])
+        search_task = None
+
+    # ------- Answer cache (เฉพาะคำถามที่ไม่ขึ้นกับประวัติการสนทนา และค้น collection เดียว) -------
+    use_answer_cache = request.use_answer_cache and not history_str.strip() and not multi_collections
+    index_version = db_manager.get_index_version(collection_name)
+    cache_settings = answer_cache_settings(request, collection_name)
+    query_vector = None
+
+    if use_answer_cache:
+        if query_vectors_task is not None:
+            query_vector = (await query_vectors_task)[0]
+        else:
+            query_vector = await db_manager.dense_embeddings.aembed_query(user_question)
+        cached = answer_cache.lookup(
+            collection_name, query_vector, threshold=request.answer_cache_threshold, settings=cache_settings
+        )
+        if cached:
+            if search_task is not None:
+                discard_tasks([search_task])
+            final_answer = cached.answer
+
+            async def stream_cached():
+                for start in range(0, len(final_answer), CACHED_ANSWER_STREAM_CHARS):
+                    yield final_answer[start:start + CACHED_ANSWER_STREAM_CHARS]
+                asyncio.create_task(finalize_cached())
+                yield "\n"
+
+            async def finalize_cached():
+                memory.chat_memory.add_user_message(user_question)
+                memory.chat_memory.add_ai_message(final_answer)
+
+            return StreamingResponse(stream_cached(), media_type="text/plain", headers={"X-RAG-Cache": "hit"})
+
+    if multi_collections:
+        data_from_rag, pruned = await perform_multi_search(
+            prompt=request.prompt,
+            collection_names=multi_collections,
+            l_search=request.l_search,
+            l_chunk=request.l_chunk,
+            params={name: search_params_for(request, name) for name in multi_collections},
+            timeout=request.collection_timeout,
+        )
+    elif search_task is not None:
+        data_from_rag, pruned = await search_task
     else:
-        collection_name = "unknown"
-        
-    data_from_rag = await perform_search(
-        prompt=request.prompt, 
-        collection_name=collection_name, 
-        l_search=request.l_search, 
-        l_chunk=request.l_chunk
+        data_from_rag, pruned = await perform_search(
+            prompt=request.prompt, 
+            collection_name=collection_name, 
+            l_search=request.l_search, 
+            l_chunk=request.l_chunk,
+            params=search_params_for(request, collection_name),
+        )
+    # บีบอัดแบบ extractive: เก็บเฉพาะประโยคที่ใกล้คำถาม (ใช้ query embedding ที่ cache ไว้แล้ว)
+    if request.compress_ratio is not None and data_from_rag:
+        if query_vector is None:
+            query_vector = await db_manager.dense_embeddings.aembed_query(user_question)
+        data_from_rag = await compress_contexts(
+            data_from_rag, query_vector, db_manager.dense_embeddings, request.compress_ratio
+        )
+
+    # parent ที่ score ไม่ถึงเกณฑ์ถูกตัดไปตั้งแต่ใน query แล้ว
+    # เติมบริบทตามลำดับ score ให้พอดีงบ token ที่เหลือจาก template + ประวัติ + คำถาม
+    budget = context_budget(
+        llm_manager.get_context_window(),
+        set_prompt_expert(category, "", history_str, user_question),
     )
-    filtered_contents = [item["content"] for item in data_from_rag if item["score"] > 0.2]
-    context = "\n".join(filtered_contents)
+    packed = pack_contexts(data_from_rag, budget, collection_name, index_version)
+    context = packed.text
+    print(f"บริบท {packed.parents} parent, {packed.tokens}/{budget} tokens (ตัดทิ้งจาก score_threshold {pruned})")
 
     prompt_rag = set_prompt_expert(category, context, history_str, user_question)
 
     final_answer = ""
+    stream_completed = False
     async def stream_rag():
-        nonlocal final_answer
+        nonlocal final_answer, stream_completed
         print("Start streaming rag response")
         try:
             async for chunk in llm_manager.llm.astream(prompt_rag):
                 final_answer += chunk
                 yield chunk
+            stream_completed = True
         except Exception as e:
             print("❌ Error while streaming:", e)
         finally:
@@ -402,6 +598,10 @@ async def search_endpoint(request: SearchRequest):
         memory.chat_memory.add_user_message(user_question)
         memory.chat_memory.add_ai_message(final_answer)
 
+        # เก็บคำตอบที่ stream ครบลง answer cache
+        if use_answer_cache and stream_completed and final_answer.strip():
+            answer_cache.store(collection_name, query_vector, user_question, final_answer, index_version, cache_settings)
+
         history_now = memory.load_memory_variables({})["history"]
 
         # เช็คว่าเกินจุด trigger การสรุปหรือยัง
@@ -438,4 +638,14 @@ async def search_endpoint(request: SearchRequest):
     # print('history-rag-memory : ', history)
     # print('instance memory : ',id(memory_stores[user_id]["rag"]))
     # print('ประวัติการสนทนา มี RAG : ', history_str)
-    return StreamingResponse(stream_rag(), media_type="text/plain")
\ No newline at end of file
+    return StreamingResponse(
+        stream_rag(),
+        media_type="text/plain",
+        headers={
+            "X-RAG-Contexts": str(packed.parents),
+            "X-RAG-Pruned": str(pruned),
+            "X-RAG-Context-Tokens": str(packed.tokens),
+            "X-RAG-Context-Budget": str(packed.budget),
+            "X-RAG-Cache": "miss" if use_answer_cache else "bypass",
+        },
+    )
\ No newline at end of file
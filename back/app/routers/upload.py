@@ -1,35 +1,113 @@
+import asyncio
+from functools import partial
+from pathlib import Path
 from fastapi.responses import JSONResponse
-from fastapi import APIRouter, UploadFile, File
-from app.chunks.law_chunk import add_to_vector_db
-from app.documents.file_upload import upload_documents
-from app.documents.markdown_type import route_markdown_transform
+from typing import Callable, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from app.chunks.law_chunk import DEFAULT_STORAGE_PROFILE, STORAGE_PROFILES, index_markdown_lines, rollback_collection
+from app.documents.file_markdown import MARKDOWN_ARTIFACT_DIR
+from app.documents.file_upload import commit_upload, discard_upload, upload_documents
+from app.documents.markdown_type import route_markdown_stream
+from app.managers.db_manager import db_manager
+from app.managers.ingest_job_manager import ingest_job_manager
 
 router = APIRouter()
 
-@router.post("/upload-pdf")
+def ingest_pdf(
+    file_path,
+    source: str,
+    sha256: str,
+    storage_profile: str,
+    recreate: bool,
+    progress: Callable[..., None],
+) -> dict:
+    """
+    งาน ingest ที่รันใน worker ของ ingest_job_manager: PDF → markdown → section → chunk ต่อกันใน memory
+    แล้ว index และลงทะเบียนไฟล์ (ไฟล์ markdown เป็นแค่ผลพลอยได้ตาม MARKDOWN_ARTIFACT_DIR)
+    source = ชื่อเอกสารตามที่อัปโหลด (file_path มี sha256 ต่อท้ายชื่อ ใช้เป็น source ไม่ได้)
+    """
+    md_lines, doc_type = route_markdown_stream(file_path, progress=progress, output_dir=MARKDOWN_ARTIFACT_DIR or None)
+    if (doc_type == "law"):
+        collection_name = "thai_law_hybrid"
+    else:
+        collection_name = "default"
+
+    index_report = index_markdown_lines(md_lines, source, collection_name, doc_type, storage_profile, recreate, progress=progress)
+    md_path = Path(MARKDOWN_ARTIFACT_DIR) / f"{Path(file_path).stem}.md" if MARKDOWN_ARTIFACT_DIR and doc_type == "law" else None
+    record = {
+        "file_path": str(file_path),
+        "sha256": sha256,
+        "md_path": str(md_path) if md_path else None,
+        "collection_name": collection_name,
+        "index_report": index_report,
+    }
+    db_manager.file_registry.put(sha256, collection_name, source, record)
+    return record
+
+@router.post("/upload-pdf", status_code=202)
 async def upload_pdf(
     file: UploadFile = File(...),
     # collection_name: str = Form(...),
+    storage_profile: Optional[str] = Form(None),  # ram-float | int8-scalar | binary+rescore | on-disk
+    recreate: bool = Form(False),  # ลบแล้วสร้าง collection ใหม่ (เช่น เปลี่ยน storage profile)
 ):
+    storage_profile = storage_profile or DEFAULT_STORAGE_PROFILE
+    if storage_profile not in STORAGE_PROFILES:
+        return JSONResponse(status_code=400, content={"error": f"ไม่รู้จัก storage profile: {storage_profile}"})
+
     try:
-        file_path = upload_documents(file)
-        md_path, doc_type = route_markdown_transform(file_path)
-        if (doc_type == "law"):
-            collection_name = "thai_law_hybrid"
-        else:
-            collection_name = "default"
-
-        add_to_vector_db(md_path, collection_name, doc_type)
-    except ValueError as ve:
-        return JSONResponse(status_code=400, content={"error": str(ve)})
+        # บันทึกไฟล์แบบ stream + SHA-256 ใน thread แยก ไม่บล็อก event loop ของแชท
+        uploaded = await asyncio.to_thread(upload_documents, file)
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Error: {str(e)}"})
 
+    # เนื้อไฟล์เดียวกันเคย index แล้ว → ไม่ต้องทำอะไรอีก (ยกเว้นสั่ง recreate)
+    existing = None if recreate else db_manager.file_registry.get(uploaded.sha256)
+    if existing is not None:
+        discard_upload(uploaded)
+        print(f"♻️ ไฟล์ซ้ำ ({uploaded.sha256[:12]}) ข้ามการ index: {uploaded.filename}")
+        return JSONResponse(status_code=200, content={"duplicate": True, "filename": uploaded.filename, **existing})
+
+    file_path = commit_upload(uploaded)
+
+    # แปลงและ index ใน background แล้วตอบ job_id กลับทันที
+    job = ingest_job_manager.submit(
+        uploaded.filename, partial(ingest_pdf, file_path, Path(uploaded.filename).stem, uploaded.sha256, storage_profile, recreate)
+    )
+
     return {
-        "filename": file.filename,
+        "job_id": job.job_id,
+        "status": job.status,
+        "filename": uploaded.filename,
         "file_path": str(file_path),
-        "md_path": str(md_path),
-        # "preview": preview,
-        # "chunks_added": len(chunks),
-        # "saved_markdown": md_path
-    }
\ No newline at end of file
+        "sha256": uploaded.sha256,
+        "filesize": uploaded.filesize,
+    }
+
+@router.get("/upload-jobs")
+def list_upload_jobs():
+    return [job.to_dict() for job in ingest_job_manager.list_jobs()]
+
+@router.get("/upload-jobs/{job_id}")
+def get_upload_job(job_id: str):
+    job = ingest_job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"ไม่พบงาน {job_id}"})
+    return job.to_dict()
+
+@router.post("/upload-jobs/{job_id}/cancel")
+def cancel_upload_job(job_id: str):
+    job = ingest_job_manager.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"ไม่พบงาน {job_id}"})
+    return job.to_dict()
+
+@router.post("/collections/{collection_name}/rollback")
+def rollback(collection_name: str):
+    try:
+        previous = rollback_collection(collection_name)
+    except ValueError as ve:
+        return JSONResponse(status_code=400, content={"error": str(ve)})
+    return {"collection_name": collection_name, "active": previous}
@@ -0,0 +1,206 @@
+import io
+import re
+import sys
+import time
+import unicodedata
+from typing import Optional
+
+import fitz  # PyMuPDF
+
+from app.documents.file_markdown import (
+    clean_line,
+    detect_royal_gazette_header,
+    thai_digit_to_int,
+    write_law_markdown,
+)
+
+# เทียบความเร็วขั้นแปลงบรรทัดเป็น markdown กฎหมาย (ไม่นับเวลาอ่าน PDF):
+#   legacy     = แบบเดิม clean_line ซ้ำในทุก helper + regex ที่ไม่ได้ compile + ต่อ string ทุกหน้าต่างตอนหาหัวราชกิจจาฯ
+#   classifier = clean ครั้งเดียว + จำแนกบรรทัดด้วย regex ที่ compile แล้วใน match เดียว
+# และตรวจว่า markdown ที่ได้ตรงกันทุก byte
+# ใช้: python benchmark_law_markdown.py <pdf_path> [จำนวนรอบ] [mark_type]
+#   เช่น python benchmark_law_markdown.py external_data/law.pdf 20
+
+
+# ---- แบบเดิม (ก่อนมีตัวจำแนกบรรทัด) เก็บไว้เป็นตัวเทียบ ----
+
+def legacy_clean_line(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"[\u200B\u00A0\u202F]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+def legacy_extract_matra_number(text: str) -> Optional[int]:
+    m = re.match(r"^มาตรา\s+([๐๑๒๓๔๕๖๗๘๙\d]+)", legacy_clean_line(text))
+    return thai_digit_to_int(m.group(1)) if m else None
+
+def legacy_is_matra_number_only_line(line: str) -> bool:
+    line = legacy_clean_line(line)
+    return bool(re.fullmatch(r"[๐๑๒๓๔๕๖๗๘๙\d]{1,4}", line))
+
+def legacy_extract_standalone_matra(line: str) -> str | None:
+    line = legacy_clean_line(line)
+    m = re.fullmatch(r"(มาตรา\s+[๐๑๒๓๔๕๖๗๘๙\d]+(?:/[๐๑๒๓๔๕๖๗๘๙\d]+)?(?: ทวิ| ตรี| จัตวา)?)", line)
+    return m.group(1) if m else None
+
+def legacy_extract_matra_at_line_start(line: str) -> str | None:
+    line = legacy_clean_line(line)
+    m = re.match(r"^(มาตรา\s+[๐๑๒๓๔๕๖๗๘๙\d]+(?:/[๐๑๒๓๔๕๖๗๘๙\d]+)?(?: ทวิ| ตรี| จัตวา)?)\b", line)
+    return m.group(1) if m and len(m.group(0)) >= 7 else None
+
+def legacy_detect_royal_gazette_header(lines: list[str]) -> Optional[int]:
+    page_line_pattern = r"^หน้า\s+[๐-๙\d]+$"
+    header_pattern = r"""
+    ^เล่ม\s+[๐-๙\d]+\s+ตอนที่\s+[๐-๙\d]+(?:\s+[ก-ฮ])?\s+
+    ราชกิจจานุเบกษา\s+
+    [๐-๙\d]+\s+[ก-๙]+\s+[๐-๙\d]{4}$
+    """
+
+    for i in range(len(lines) - 3):
+        if re.fullmatch(page_line_pattern, lines[i].strip()):
+            combined = f"{lines[i+1].strip()} {lines[i+2].strip()} {lines[i+3].strip()}"
+            if re.fullmatch(header_pattern, combined, flags=re.VERBOSE):
+                return i
+
+    for i in range(len(lines) - 2):
+        combined = f"{lines[i].strip()} {lines[i+1].strip()} {lines[i+2].strip()}"
+        if re.fullmatch(header_pattern, combined, flags=re.VERBOSE):
+            return i
+
+    return None
+
+def legacy_write_law_markdown(f, pages, mark_type: str):
+    buffer_line = None
+    previous_matra = None
+    first_line_mark_type = 0
+
+    for page_number, lines in enumerate(pages):
+        i = 0
+
+        while i < len(lines):
+            line = lines[i]
+
+            if page_number == 0 and line.startswith(mark_type):
+                if (first_line_mark_type == 0):
+                    f.write(f"# {mark_type}\n\n")
+                    first_line_mark_type = 1
+                    i += 1
+                    continue
+
+            if buffer_line:
+                full = f"{buffer_line} {line}"
+                if buffer_line.startswith("หมวด"):
+                    f.write(f"## {full}\n\n")
+                elif buffer_line.startswith("ส่วนที่"):
+                    f.write(f"### {full}\n\n")
+                buffer_line = None
+                i += 1
+                continue
+
+            if re.fullmatch(r"หมวด\s+[๐๑๒๓๔๕๖๗๘๙\d]+", line):
+                buffer_line = line
+                i += 1
+                continue
+
+            if line.startswith("ส่วนที่"):
+                buffer_line = line
+                i += 1
+                continue
+
+            if line == "มาตรา" and i + 1 < len(lines) and legacy_is_matra_number_only_line(lines[i + 1]):
+                full = f"มาตรา {legacy_clean_line(lines[i + 1])}"
+                number = legacy_extract_matra_number(full)
+                if previous_matra is None or (number == previous_matra + 1):
+                    previous_matra = number
+                    f.write(f"#### {full}\n\n")
+                    i += 2
+                    continue
+
+            matra_text = legacy_extract_standalone_matra(line)
+            if matra_text:
+                number = legacy_extract_matra_number(matra_text)
+                if previous_matra is None or (number == previous_matra + 1):
+                    f.write(f"#### {matra_text}\n\n")
+                    previous_matra = number
+                    after = line[len(matra_text):].strip()
+                    if after:
+                        f.write(after + "\n\n")
+                    i += 1
+                    continue
+
+            partial = legacy_extract_matra_at_line_start(line)
+            if partial:
+                number = legacy_extract_matra_number(partial)
+                if previous_matra is None or (number == previous_matra + 1):
+                    f.write(f"#### {partial}\n\n")
+                    previous_matra = number
+                    after = line[len(partial):].strip()
+                    if after:
+                        f.write(after + "\n\n")
+                    i += 1
+                    continue
+
+            if any(line.startswith(h) for h in ["บทเฉพาะกาล", "บทนิยาม", "บทกำหนดโทษ"]):
+                f.write(f"## {line}\n\n")
+                i += 1
+                continue
+
+            f.write(line + "\n\n")
+            i += 1
+
+
+# ---- benchmark ----
+
+def prepare_pages(raw_pages, detect, clean):
+    """ลบหัวราชกิจจาฯ + clean ทุกบรรทัด (เหมือน extract_page_lines แต่ใช้ข้อความที่ดึงจาก PDF ไว้แล้ว)"""
+    pages = []
+    for raw_lines in raw_pages:
+        lines = list(raw_lines)
+        header_index = detect(lines)
+        if header_index is not None:
+            del lines[header_index:header_index + 4 if lines[header_index].startswith("หน้า") else header_index + 3]
+        pages.append([clean(line) for line in lines])
+    return pages
+
+def run(raw_pages, detect, clean, write, mark_type, rounds):
+    """คืน (markdown, เวลาที่ดีที่สุดของขั้น prepare, ของขั้น write)"""
+    best_prepare = best_write = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        pages = prepare_pages(raw_pages, detect, clean)
+        prepared = time.perf_counter()
+        buffer = io.StringIO()
+        write(buffer, pages, mark_type)
+        finished = time.perf_counter()
+        best_prepare = min(best_prepare, prepared - started)
+        best_write = min(best_write, finished - prepared)
+    return buffer.getvalue(), best_prepare, best_write
+
+
+if len(sys.argv) < 2:
+    sys.exit("ใช้: python benchmark_law_markdown.py <pdf_path> [จำนวนรอบ] [mark_type]")
+pdf_path = sys.argv[1]
+rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+mark_type = sys.argv[3] if len(sys.argv) > 3 else "พระราชบัญญัติ"
+
+with fitz.open(pdf_path) as doc:
+    raw_pages = [page.get_text().splitlines() for page in doc]
+line_count = sum(len(lines) for lines in raw_pages)
+print(f"📄 {pdf_path}: {len(raw_pages)} หน้า {line_count} บรรทัด, {rounds} รอบ (แสดงเวลาที่ดีที่สุด)")
+
+legacy = run(raw_pages, legacy_detect_royal_gazette_header, legacy_clean_line, legacy_write_law_markdown, mark_type, rounds)
+classifier = run(raw_pages, detect_royal_gazette_header, clean_line, write_law_markdown, mark_type, rounds)
+
+for name, (_, prepare_seconds, write_seconds) in (("legacy", legacy), ("classifier", classifier)):
+    total = prepare_seconds + write_seconds
+    print(
+        f"  {name:<10} prepare {prepare_seconds * 1000:8.2f} ms  write {write_seconds * 1000:8.2f} ms  "
+        f"รวม {total * 1000:8.2f} ms  ({line_count / total:,.0f} บรรทัด/s)"
+    )
+
+speedup = (legacy[1] + legacy[2]) / (classifier[1] + classifier[2])
+print(f"⚡ เร็วขึ้น {speedup:.2f} เท่า")
+if legacy[0] == classifier[0]:
+    print("✅ markdown ตรงกันทุก byte")
+else:
+    sys.exit("❌ markdown ไม่ตรงกัน")
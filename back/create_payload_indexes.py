@@ -0,0 +1,15 @@
+import sys
+
+from app.chunks.law_chunk import create_payload_indexes
+from app.managers.db_manager import db_manager
+
+# เพิ่ม payload index ให้ collection ที่สร้างไว้แล้ว โดยไม่ต้อง embed ใหม่
+# ใช้: python create_payload_indexes.py <collection_name> [doc_type]
+#   เช่น python create_payload_indexes.py thai_law_hybrid law
+#        python create_payload_indexes.py welfare
+
+collection_name = sys.argv[1] if len(sys.argv) > 1 else "thai_law_hybrid"
+doc_type = sys.argv[2] if len(sys.argv) > 2 else ("law" if collection_name == "thai_law_hybrid" else "unknown")
+
+# ชื่อที่ส่งมาอาจเป็น alias → สร้าง index บน collection version ที่ alias ชี้อยู่
+create_payload_indexes(db_manager.client, db_manager.resolve_collection(collection_name), doc_type)